@@ -0,0 +1,53 @@
+"""Время списка цитат в админке на большом каталоге.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.admin_changelist --quotes 1000000
+"""
+
+import argparse
+
+from .base import print_table, run_case, setup_django, temporary_database
+
+
+def run(count, repeat):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+
+    from .generator import generate_catalog
+
+    generate_catalog(count)
+    client = Client()
+    client.force_login(User.objects.create_superuser("admin", "", "admin"))
+    url = reverse("admin:catalog_quote_changelist")
+    middle = count // 2
+
+    cases = {
+        "changelist": url,
+        "page 50": f"{url}?p=50",
+        "filter views 10-100": f"{url}?views_range=10-100",
+        "search text prefix": f"{url}?q=Синтетическая цитата номер {middle}",
+        "search source prefix": f"{url}?q=Источник {middle // 3}",
+    }
+    results = {
+        name: run_case(lambda path=path: client.get(path), repeat, warmup=2)
+        for name, path in cases.items()
+    }
+    print(f"quotes: {count}")
+    print_table(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with temporary_database():
+        run(args.quotes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Общие утилиты бенчмарков: настройка Django, временная база, замеры"""
+
+import os
+import statistics
+import time
+from contextlib import ExitStack, contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "quotes.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def temporary_database(name=None):
+    """Создаёт тестовую базу, чтобы не трогать рабочую db.sqlite3.
+
+    Без name SQLite создаёт базу в памяти; файл нужен, когда важны
+    настоящие блокировки между потоками. setup_test_environment() здесь не
+    вызывается: он оборачивает рендеринг шаблонов и завышает замеры страниц.
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    if name:
+        connection.settings_dict["TEST"]["NAME"] = name
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class QueryCounter:
+    """Считает SQL-запросы на всех подключениях, работает и при DEBUG = False"""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def active(self):
+        from django.db import connections
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+def measure(func, repeat):
+    """Возвращает список длительностей вызова func в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples, queries=None):
+    ordered = sorted(samples)
+    stats = {
+        "calls": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": percentile(ordered, 0.50),
+        "p95_ms": percentile(ordered, 0.95),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": ordered[-1],
+    }
+    if queries is not None:
+        stats["queries_per_call"] = queries / len(ordered)
+    return stats
+
+
+def run_case(func, repeat, warmup=3):
+    """Прогрев, затем замер времени и числа запросов на вызов"""
+    for _ in range(warmup):
+        func()
+    with QueryCounter().active() as counter:
+        samples = measure(func, repeat)
+    return summarize(samples, counter.queries)
+
+
+def print_table(results):
+    print(
+        f"{'case':<32} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'max ms':>9} {'queries':>8}"
+    )
+    for name, stats in results.items():
+        queries = stats.get("queries_per_call")
+        print(
+            f"{name:<32} {stats['calls']:>6} {stats['p50_ms']:>9.3f} "
+            f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f} "
+            f"{'' if queries is None else f'{queries:.1f}':>8}"
+        )
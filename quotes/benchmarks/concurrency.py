@@ -0,0 +1,57 @@
+"""Сравнение WSGI-потоков и ASGI-задач на одной и той же смеси запросов.
+
+Для каждого уровня параллелизма запускает benchmarks.loadtest дважды:
+N потоков через quotes.wsgi и N asyncio-задач через quotes.asgi с
+асинхронными представлениями. По умолчанию смесь только из чтений, чтобы
+сравнивать обслуживание страниц, а не блокировки записи SQLite.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.concurrency --levels 1 8 32 --duration 10
+"""
+
+import argparse
+import os
+import tempfile
+
+from .base import setup_django, temporary_database
+from .loadtest import DEFAULT_MIX, run
+
+READ_MIX = {"random_page": 85, "top_page": 15}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=10_000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5, help="Секунды")
+    parser.add_argument(
+        "--with-writes", action="store_true", help="Полная смесь loadtest"
+    )
+    args = parser.parse_args()
+    mix = DEFAULT_MIX if args.with_writes else READ_MIX
+
+    setup_django()
+    print(
+        f"{'workers':>7} {'server':<6} {'req/s':>9} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    )
+    for workers in args.levels:
+        for asgi in (False, True):
+            run_args = argparse.Namespace(
+                quotes=args.quotes, workers=workers, duration=args.duration, asgi=asgi
+            )
+            with tempfile.TemporaryDirectory() as directory:
+                with temporary_database(os.path.join(directory, "bench.sqlite3")):
+                    report = run(run_args, mix)
+            latencies = report["cases"]["random_page"]
+            print(
+                f"{workers:>7} {'asgi' if asgi else 'wsgi':<6} "
+                f"{report['throughput_rps']:>9.1f} {latencies['p50_ms']:>9.3f} "
+                f"{latencies['p95_ms']:>9.3f} {latencies['p99_ms']:>9.3f} "
+                f"{sum(report['errors'].values()):>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
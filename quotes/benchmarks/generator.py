@@ -0,0 +1,118 @@
+"""Генератор синтетического каталога для бенчмарков"""
+
+import random
+import uuid
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+SOURCE_TYPES = ["Фильм", "Книга", "Сериал", "Песня", "Пьеса"]
+BATCH_SIZE = 10_000
+
+
+def _insert(model, fields, rows):
+    """Вставка пачки строк одним executemany, без сборки объектов модели"""
+    qn = connection.ops.quote_name
+    model_fields = [model._meta.get_field(name) for name in fields]
+    columns = ", ".join(qn(field.column) for field in model_fields)
+    placeholders = ", ".join(["%s"] * len(model_fields))
+    sql = f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    prepared = [
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(model_fields, row)
+        ]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, prepared)
+
+
+def generate_catalog(count, seed=0, quotes_per_source=3):
+    """Создаёт count цитат с перекошенными весами и лайками.
+
+    Веса и лайки распределены по Парето, у каждого источника до
+    quotes_per_source цитат, счётчики источников заполнены сразу.
+    Возвращает список id цитат.
+    """
+    from catalog import leaderboard, sampling
+    from catalog.models import Quote, Source, SourceType, text_digest
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    types = [SourceType.objects.get_or_create(name=name)[0] for name in SOURCE_TYPES]
+    quote_ids = []
+
+    with transaction.atomic():
+        source_count = -(-count // quotes_per_source)
+        for start in range(0, source_count, BATCH_SIZE):
+            rows = []
+            for index in range(start, min(start + BATCH_SIZE, source_count)):
+                active = min(quotes_per_source, count - index * quotes_per_source)
+                rows.append(
+                    (
+                        uuid.UUID(int=index + 1),
+                        True,
+                        now,
+                        now,
+                        f"Источник {index}",
+                        types[index % len(types)].pk,
+                        active,
+                    )
+                )
+            _insert(
+                Source,
+                [
+                    "id",
+                    "is_active",
+                    "created_at",
+                    "updated_at",
+                    "name",
+                    "source_type",
+                    "active_quote_count",
+                ],
+                rows,
+            )
+
+        for start in range(0, count, BATCH_SIZE):
+            rows = []
+            for index in range(start, min(start + BATCH_SIZE, count)):
+                text = f"Синтетическая цитата номер {index}"
+                quote_id = uuid.UUID(int=(1 << 64) + index)
+                quote_ids.append(quote_id)
+                rows.append(
+                    (
+                        quote_id,
+                        True,
+                        now,
+                        now,
+                        text,
+                        text_digest(text),
+                        uuid.UUID(int=index // quotes_per_source + 1),
+                        min(int(rng.paretovariate(1.1)), 100),
+                        int(rng.paretovariate(1.5)) * 10,
+                        int(rng.paretovariate(1.2)) - 1,
+                        int(rng.paretovariate(2.0)) - 1,
+                    )
+                )
+            _insert(
+                Quote,
+                [
+                    "id",
+                    "is_active",
+                    "created_at",
+                    "updated_at",
+                    "text",
+                    "text_hash",
+                    "source",
+                    "weight",
+                    "views",
+                    "likes",
+                    "dislikes",
+                ],
+                rows,
+            )
+    # Сырые вставки не шлют сигналов, поэтому кэши сбрасываем явно
+    sampling.invalidate()
+    leaderboard.invalidate()
+    return quote_ids
@@ -0,0 +1,54 @@
+"""Сравнение топа по лайкам: запрос с сортировкой против Leaderboard.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.leaderboard --quotes 100000
+"""
+
+import argparse
+import random
+
+from .base import measure, print_table, setup_django, summarize, temporary_database
+
+
+def run(count, repeat):
+    from catalog.leaderboard import Leaderboard
+    from catalog.models import Quote
+
+    from .generator import generate_catalog
+
+    generate_catalog(count)
+    board = Leaderboard()
+    ids = list(Quote.objects.values_list("id", flat=True)[:1000])
+
+    def query():
+        # Как в прежнем top_quotes_view: шаблон лениво дочитывает источники
+        for quote in Quote.objects.filter(is_active=True).order_by("-likes")[:20]:
+            quote.source.source_type
+
+    def vote():
+        board.record_likes(random.choice(ids), random.randint(0, 50))
+
+    board.top_quotes()
+    results = {
+        "order_by(-likes)[:20] + sources": summarize(measure(query, repeat)),
+        "Leaderboard.top_quotes": summarize(measure(board.top_quotes, repeat)),
+        "Leaderboard.record_likes": summarize(measure(vote, repeat)),
+    }
+    print(f"quotes: {count}")
+    print_table(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    with temporary_database():
+        run(args.quotes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""Нагрузочный тест приложения внутри процесса, без сети и внешних утилит.
+
+Потоки (или asyncio-задачи для --asgi) вызывают quotes.wsgi.application
+напрямую со смесью запросов: анонимные просмотры страниц, лайки и
+добавление цитат от вошедших пользователей. База — временный файл SQLite,
+поэтому блокировки между записью счётчиков и чтением настоящие.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.loadtest --quotes 100000 --workers 8 --duration 30
+    python -m benchmarks.loadtest --asgi --workers 32
+    python -m benchmarks.loadtest --random-pool 64
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode
+
+from .base import percentile, setup_django, temporary_database
+
+# Доля каждого вида запросов в смеси
+DEFAULT_MIX = {
+    "random_page": 70,
+    "top_page": 10,
+    "like": 12,
+    "dislike": 5,
+    "add_quote": 3,
+}
+CSRF_TOKEN = "loadtestloadtestloadtestloadtest"
+USERS = 20
+
+
+class Stats:
+    """Результаты одного прогона, общие для всех потоков"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds, status):
+        with self._lock:
+            self.latencies[kind].append(seconds * 1000)
+            self.statuses[status] += 1
+
+    def record_exception(self, sender, request=None, **kwargs):
+        import sys
+
+        exc = sys.exc_info()[1]
+        with self._lock:
+            self.errors[f"{type(exc).__name__}: {exc}"] += 1
+
+    @property
+    def lock_errors(self):
+        return sum(
+            count for error, count in self.errors.items() if "locked" in error.lower()
+        )
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.latencies.values())
+        cases = {}
+        for kind, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            cases[kind] = {
+                "requests": len(ordered),
+                "p50_ms": percentile(ordered, 0.50),
+                "p95_ms": percentile(ordered, 0.95),
+                "p99_ms": percentile(ordered, 0.99),
+                "max_ms": ordered[-1],
+            }
+        return {
+            "requests": total,
+            "elapsed_s": elapsed,
+            "throughput_rps": total / elapsed if elapsed else 0,
+            "statuses": {str(status): n for status, n in self.statuses.items()},
+            "lock_errors": self.lock_errors,
+            "errors": dict(self.errors),
+            "cases": cases,
+        }
+
+
+class Workload:
+    """Строит запросы смеси: путь, метод, тело и cookie пользователя"""
+
+    def __init__(self, quote_ids, sessions, source_type_id, mix):
+        self.quote_ids = quote_ids
+        self.sessions = sessions
+        self.source_type_id = source_type_id
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self._numbers = iter(range(10**9))
+        self._lock = threading.Lock()
+
+    def next_number(self):
+        with self._lock:
+            return next(self._numbers)
+
+    def build(self, rng):
+        from django.urls import reverse
+
+        kind = rng.choices(self.kinds, self.weights)[0]
+        if kind == "random_page":
+            return kind, "GET", reverse("random_quote_view"), None, None
+        if kind == "top_page":
+            return kind, "GET", reverse("top_quotes"), None, None
+
+        session = rng.choice(self.sessions)
+        if kind in ("like", "dislike"):
+            path = reverse(f"{kind}_quote", args=[rng.choice(self.quote_ids)])
+            return kind, "POST", path, {}, session
+
+        number = self.next_number()
+        body = {
+            "text": f"Цитата из нагрузочного теста {number}",
+            "source_name": f"Источник нагрузочного теста {number}",
+            "source_type": self.source_type_id,
+            "weight": rng.randint(1, 100),
+        }
+        return kind, "POST", reverse("add_quote"), body, session
+
+
+def build_environ(method, path, data, session):
+    body = urlencode(data).encode() if data is not None else b""
+    cookies = [f"csrftoken={CSRF_TOKEN}"]
+    if session:
+        cookies.append(f"sessionid={session}")
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "testserver",
+        "HTTP_COOKIE": "; ".join(cookies),
+        "HTTP_X_CSRFTOKEN": CSRF_TOKEN,
+        "CONTENT_TYPE": "application/x-www-form-urlencoded",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+
+def call_wsgi(application, method, path, data, session):
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split(" ", 1)[0]))
+
+    result = application(build_environ(method, path, data, session), start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        # close() шлёт request_finished: сброс буфера просмотров и закрытие соединения
+        if hasattr(result, "close"):
+            result.close()
+    return status[0]
+
+
+async def call_asgi(application, method, path, data, session):
+    body = urlencode(data).encode() if data is not None else b""
+    cookies = [f"csrftoken={CSRF_TOKEN}"]
+    if session:
+        cookies.append(f"sessionid={session}")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 0),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"cookie", "; ".join(cookies).encode()),
+            (b"x-csrftoken", CSRF_TOKEN.encode()),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    status = []
+    body_sent = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif not message.get("more_body"):
+            done.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def thread_worker(application, workload, stats, deadline, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        kind, method, path, data, session = workload.build(rng)
+        started = time.perf_counter()
+        status = call_wsgi(application, method, path, data, session)
+        stats.record(kind, time.perf_counter() - started, status)
+
+
+async def async_worker(application, workload, stats, deadline, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        kind, method, path, data, session = workload.build(rng)
+        started = time.perf_counter()
+        status = await call_asgi(application, method, path, data, session)
+        stats.record(kind, time.perf_counter() - started, status)
+
+
+def prepare(count):
+    """Каталог, пользователи с готовыми сессиями и общие данные для смеси"""
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from catalog.models import SourceType
+
+    from .generator import generate_catalog
+
+    quote_ids = generate_catalog(count)
+    sessions = []
+    for number in range(USERS):
+        client = Client()
+        client.force_login(User.objects.create_user(username=f"load{number}"))
+        sessions.append(client.cookies["sessionid"].value)
+    return quote_ids, sessions, SourceType.objects.first().pk
+
+
+def run(args, mix=DEFAULT_MIX):
+    from django.core.signals import got_request_exception
+    from django.db import connections
+
+    from catalog import viewcounts
+
+    quote_ids, sessions, source_type_id = prepare(args.quotes)
+    # Соединение главного потока больше не нужно и не должно держать блокировок
+    connections.close_all()
+
+    workload = Workload(quote_ids, sessions, source_type_id, mix)
+    stats = Stats()
+    got_request_exception.connect(stats.record_exception)
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+
+    if args.asgi:
+        from django.core.asgi import get_asgi_application
+
+        application = get_asgi_application()
+
+        async def main():
+            await asyncio.gather(
+                *(
+                    async_worker(application, workload, stats, deadline, seed)
+                    for seed in range(args.workers)
+                )
+            )
+
+        asyncio.run(main())
+    else:
+        from django.core.wsgi import get_wsgi_application
+
+        application = get_wsgi_application()
+        threads = [
+            threading.Thread(
+                target=thread_worker,
+                args=(application, workload, stats, deadline, seed),
+            )
+            for seed in range(args.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    elapsed = time.perf_counter() - started
+    got_request_exception.disconnect(stats.record_exception)
+    # Остаток буфера просмотров пишем сейчас, пока временная база ещё существует
+    viewcounts.flush()
+    connections.close_all()
+    return stats.report(elapsed)
+
+
+def print_report(report):
+    print(
+        f"requests: {report['requests']}, {report['throughput_rps']:.1f} req/s "
+        f"за {report['elapsed_s']:.1f} с"
+    )
+    print(f"statuses: {report['statuses']}, lock errors: {report['lock_errors']}")
+    print(
+        f"{'case':<14} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'max ms':>9}"
+    )
+    for name, case in report["cases"].items():
+        print(
+            f"{name:<14} {case['requests']:>9} {case['p50_ms']:>9.3f} "
+            f"{case['p95_ms']:>9.3f} {case['p99_ms']:>9.3f} {case['max_ms']:>9.3f}"
+        )
+    for error, count in report["errors"].items():
+        print(f"  {count:>6} x {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="Секунды")
+    parser.add_argument("--asgi", action="store_true", help="quotes.asgi вместо WSGI")
+    parser.add_argument(
+        "--random-pool",
+        type=int,
+        default=None,
+        help="RANDOM_PAGE_POOL_SIZE на время прогона (0 — без пула)",
+    )
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    overrides = {}
+    if args.random_pool is not None:
+        overrides["RANDOM_PAGE_POOL_SIZE"] = args.random_pool
+    with tempfile.TemporaryDirectory() as directory, override_settings(**overrides):
+        with temporary_database(os.path.join(directory, "loadtest.sqlite3")):
+            report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Сравнение профилей SQLite под параллельными чтениями и записями.
+
+default — журнал DELETE, соединение на каждый запрос, без повторов записи
+счётчиков; tuned — SQLITE_PRAGMAS и CONN_MAX_AGE из настроек проекта.
+Каждый профиль получает свежий файл базы и ту же смесь benchmarks.loadtest.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.sqlite_profile --workers 8 --duration 10
+"""
+
+import argparse
+import os
+import tempfile
+
+from .base import setup_django, temporary_database
+from .loadtest import DEFAULT_MIX, run
+
+# Больше записи, чем в обычной смеси: лайки и сброс буфера просмотров
+WRITE_HEAVY_MIX = {"random_page": 55, "top_page": 5, "like": 30, "dislike": 10}
+
+
+def profiles():
+    from django.conf import settings
+
+    configured = settings.DATABASES["default"].get("CONN_MAX_AGE", 0)
+    return {
+        "default": (
+            {"SQLITE_PRAGMAS": {}, "COUNTER_LOCK_RETRIES": 0},
+            0,
+        ),
+        "tuned": ({}, configured),
+    }
+
+
+def run_profile(args, mix, overrides, conn_max_age):
+    from django.db import connections
+    from django.test import override_settings
+
+    database = connections.settings["default"]
+    previous = database["CONN_MAX_AGE"]
+    database["CONN_MAX_AGE"] = conn_max_age
+    try:
+        with override_settings(**overrides):
+            with tempfile.TemporaryDirectory() as directory:
+                name = os.path.join(directory, "profile.sqlite3")
+                with temporary_database(name):
+                    return run(args, mix)
+    finally:
+        database["CONN_MAX_AGE"] = previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="Секунды")
+    args = parser.parse_args()
+    args.asgi = False
+
+    setup_django()
+    print(
+        f"{'mix':<12} {'profile':<8} {'req/s':>9} {'read p95':>9} "
+        f"{'write p95':>10} {'write p99':>10} {'lock err':>9}"
+    )
+    for mix_name, mix in (("default", DEFAULT_MIX), ("write-heavy", WRITE_HEAVY_MIX)):
+        for name, (overrides, conn_max_age) in profiles().items():
+            report = run_profile(args, mix, overrides, conn_max_age)
+            read = report["cases"]["random_page"]
+            write = report["cases"]["like"]
+            print(
+                f"{mix_name:<12} {name:<8} {report['throughput_rps']:>9.1f} "
+                f"{read['p95_ms']:>9.1f} {write['p95_ms']:>10.1f} "
+                f"{write['p99_ms']:>10.1f} {report['lock_errors']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
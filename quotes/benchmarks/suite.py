@@ -0,0 +1,151 @@
+"""Бенчмарк горячих путей каталога на синтетических каталогах разного размера.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.suite --sizes 1000 100000 --output bench.json
+    python -m benchmarks.suite --sizes 100000 --compare bench.json
+
+Результаты сохраняются в JSON вместе с коммитом, на котором сняты, чтобы
+сравнивать прогоны между коммитами.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .base import print_table, run_case, setup_django, temporary_database
+
+# Во сколько раз p50 может вырасти, прежде чем --compare сочтёт это регрессией
+DEFAULT_THRESHOLD = 1.5
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_cases(quote_ids):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+
+    from catalog.forms import QuoteForm
+    from catalog.models import SourceType
+    from catalog.views import get_random_quote
+
+    user = User.objects.create_user(username="bench", password="bench")
+    anonymous = Client()
+    logged_in = Client()
+    logged_in.force_login(user)
+    source_type = SourceType.objects.first()
+    rng = random.Random(1)
+    counter = iter(range(10**9))
+
+    def validate_form():
+        number = next(counter)
+        form = QuoteForm(
+            data={
+                "text": f"Новая цитата для проверки формы {number}",
+                "source_name": f"Новый источник {number}",
+                "source_type": source_type.pk,
+                "weight": 5,
+            }
+        )
+        form.is_valid()
+
+    return {
+        "get_random_quote": get_random_quote,
+        "random_quote_view": lambda: anonymous.get(reverse("random_quote_view")),
+        "top_quotes_view": lambda: anonymous.get(reverse("top_quotes")),
+        "add_quote GET": lambda: logged_in.get(reverse("add_quote")),
+        "like_quote": lambda: logged_in.post(
+            reverse("like_quote", args=[rng.choice(quote_ids)])
+        ),
+        "dislike_quote": lambda: logged_in.post(
+            reverse("dislike_quote", args=[rng.choice(quote_ids)])
+        ),
+        "QuoteForm.is_valid": validate_form,
+    }
+
+
+def run_size(size, repeat):
+    from .generator import generate_catalog
+
+    started = time.perf_counter()
+    quote_ids = generate_catalog(size)
+    generated = time.perf_counter() - started
+    print(f"\nquotes: {size} (сгенерировано за {generated:.1f} с)")
+
+    results = {
+        name: run_case(func, repeat) for name, func in build_cases(quote_ids).items()
+    }
+    print_table(results)
+    return results
+
+
+def compare(current, baseline_path, threshold=DEFAULT_THRESHOLD):
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\nсравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    regressions = 0
+    for size, cases in current["sizes"].items():
+        for name, stats in cases.items():
+            old = baseline["sizes"].get(size, {}).get(name)
+            if not old:
+                continue
+            ratio = stats["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 1
+            flag = "  РЕГРЕССИЯ" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(
+                f"  {size:>8} {name:<24} p50 {old['p50_ms']:.3f} -> "
+                f"{stats['p50_ms']:.3f} ms (x{ratio:.2f}){flag}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    with temporary_database():
+        for size in args.sizes:
+            call_command("flush", interactive=False, verbosity=0)
+            report["sizes"][str(size)] = run_size(size, args.repeat)
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
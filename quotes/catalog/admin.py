@@ -1,9 +1,151 @@
+import uuid
+
 from django import forms
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
 
-from .models import Quote, Source, SourceType
+from . import routers, weights
+from .models import Quote, Source, SourceType, text_digest
+from .models import Source as SourceModel
 
 READONLY_FIELDS = ["id", "is_active", "created_at", "updated_at"]
+# Сколько секунд кэшируются числа цитат в диапазонах фильтров
+DEFAULT_FACET_CACHE_SECONDS = 300
+# С какого размера таблицы список показывает оценку числа строк вместо COUNT(*)
+DEFAULT_ESTIMATED_COUNT_THRESHOLD = 100_000
+# Верхняя граница для поиска по префиксу: больше любого символа в строке
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+def estimate_rows(model, using):
+    """Оценка числа строк таблицы без полного прохода или None"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # Максимальный rowid берётся из B-дерева за O(log n); после
+            # удалений он завышает оценку, но не меньше реального числа
+            cursor.execute(f"SELECT MAX(_ROWID_) FROM {table}")
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) по всей большой таблице.
+
+    Для нефильтрованного списка берётся оценка числа строк, для
+    отфильтрованного счёт останавливается на ADMIN_ESTIMATED_COUNT_THRESHOLD.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        threshold = getattr(
+            settings,
+            "ADMIN_ESTIMATED_COUNT_THRESHOLD",
+            DEFAULT_ESTIMATED_COUNT_THRESHOLD,
+        )
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return queryset.order_by()[:threshold].count()
+
+
+class RangeListFilter(admin.SimpleListFilter):
+    """Фильтр поля по диапазонам вместо списка всех различных значений.
+
+    Числа цитат в диапазонах считаются одним агрегирующим запросом и
+    кэшируются на ADMIN_FACET_CACHE_SECONDS.
+    """
+
+    field_name = None
+    # (значение параметра, подпись, нижняя граница, верхняя граница не включая)
+    buckets = (
+        ("0", "0", 0, 1),
+        ("1-10", "1–10", 1, 10),
+        ("10-100", "10–100", 10, 100),
+        ("100+", "100+", 100, None),
+    )
+
+    def bucket_q(self, low, high):
+        q = Q(**{f"{self.field_name}__gte": low})
+        if high is not None:
+            q &= Q(**{f"{self.field_name}__lt": high})
+        return q
+
+    def counts(self, model):
+        key = f"catalog:admin_facets:{model._meta.label_lower}:{self.field_name}"
+        counts = cache.get(key)
+        if counts is None:
+            counts = model._default_manager.aggregate(
+                **{
+                    value: Count("pk", filter=self.bucket_q(low, high))
+                    for value, _, low, high in self.buckets
+                }
+            )
+            timeout = getattr(
+                settings, "ADMIN_FACET_CACHE_SECONDS", DEFAULT_FACET_CACHE_SECONDS
+            )
+            cache.set(key, counts, timeout)
+        return counts
+
+    def lookups(self, request, model_admin):
+        counts = self.counts(model_admin.model)
+        return [
+            (value, f"{label} ({counts.get(value, 0)})")
+            for value, label, _, _ in self.buckets
+        ]
+
+    def queryset(self, request, queryset):
+        for value, _, low, high in self.buckets:
+            if self.value() == value:
+                return queryset.filter(self.bucket_q(low, high))
+        return queryset
+
+
+class WeightRangeFilter(RangeListFilter):
+    title = "Вес"
+    parameter_name = "weight_range"
+    field_name = "weight"
+    buckets = (
+        ("1-10", "1–10", 1, 10),
+        ("10-50", "10–50", 10, 50),
+        ("50+", "50+", 50, None),
+    )
+
+
+class ViewsRangeFilter(RangeListFilter):
+    title = "Просмотры"
+    parameter_name = "views_range"
+    field_name = "views"
+
+
+class LikesRangeFilter(RangeListFilter):
+    title = "Лайки"
+    parameter_name = "likes_range"
+    field_name = "likes"
+
+
+class DislikesRangeFilter(RangeListFilter):
+    title = "Дизлайки"
+    parameter_name = "dislikes_range"
+    field_name = "dislikes"
+
 
 admin.site.register(SourceType)
 
@@ -13,6 +155,10 @@ class Source(admin.ModelAdmin):
     list_display = ("name", "source_type")
 
 
+class QuoteActionForm(ActionForm):
+    weight = forms.IntegerField(label="Вес", required=False, min_value=0)
+
+
 class QuoteAdminForm(forms.ModelForm):
     class Meta:
         model = Quote
@@ -29,9 +175,26 @@ class QuoteAdminForm(forms.ModelForm):
 class QuoteAdmin(admin.ModelAdmin):
 
     list_display = ("__str__", "source", "weight", "views", "likes", "dislikes")
-    list_filter = ("weight", "views", "likes", "dislikes")
+    list_select_related = ("source",)
+    list_filter = (
+        WeightRangeFilter,
+        ViewsRangeFilter,
+        LikesRangeFilter,
+        DislikesRangeFilter,
+    )
     list_editable = ("weight",)
     readonly_fields = READONLY_FIELDS
+    show_facets = admin.ShowFacets.NEVER
+    show_full_result_count = False
+    list_per_page = 50
+    action_form = QuoteActionForm
+    actions = ["set_weight"]
+    paginator = EstimatedCountPaginator
+    search_fields = ("text", "source__name")
+    search_help_text = (
+        "Начало текста цитаты или названия источника (с учётом регистра), "
+        "точный текст или id цитаты"
+    )
 
     add_fieldsets = [
         (
@@ -73,6 +236,64 @@ class QuoteAdmin(admin.ModelAdmin):
         ),
     ]
 
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "POST" or "_save" not in request.POST:
+            with routers.replica_reads():
+                return super().changelist_view(request, extra_context)
+
+        # Сохранение list_editable: save_model только собирает веса, а
+        # записываются они одним bulk_update в той же транзакции, что и журнал
+        request._bulk_weights = {}
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            if request._bulk_weights:
+                weights.set_weights(request._bulk_weights)
+        return response
+
+    def save_model(self, request, obj, form, change):
+        bulk_weights = getattr(request, "_bulk_weights", None)
+        if bulk_weights is not None and change:
+            bulk_weights[obj.pk] = obj.weight
+            return
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Установить вес выбранным цитатам")
+    def set_weight(self, request, queryset):
+        weight = request.POST.get("weight")
+        if not weight:
+            self.message_user(request, "Укажите вес.", messages.WARNING)
+            return
+        try:
+            updated, _ = weights.set_weights(
+                {pk: weight for pk in queryset.values_list("pk", flat=True)}
+            )
+        except ValidationError as e:
+            self.message_user(request, "; ".join(e.messages), messages.ERROR)
+            return
+        self.message_user(request, f"Вес изменён у цитат: {updated}")
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо icontains по всей таблице — только поиски по индексам:
+        # первичный ключ, хэш текста и диапазоны по индексам текста и имени
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(pk=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        upper = term + PREFIX_UPPER_BOUND
+        # Имя Source в этом модуле занято классом админки источников
+        sources = SourceModel.all_objects.filter(name__gte=term, name__lt=upper)
+        return (
+            queryset.filter(
+                Q(text_hash=text_digest(term))
+                | Q(text__gte=term, text__lt=upper)
+                | Q(source__in=sources.values("pk"))
+            ),
+            False,
+        )
+
     def get_readonly_fields(self, request, obj=...):
         readonly_fields = super().get_readonly_fields(request, obj)
         if not request.user.is_superuser:
@@ -0,0 +1,188 @@
+"""Фоновые изображения страниц: манифест, который собирается один раз.
+
+Файлы ищутся в BACKGROUND_IMAGE_DIR через staticfiles-finders при первом
+обращении, а не на каждый запрос. Для каждого запоминаются размеры из
+заголовка файла и URL с хэшем содержимого из staticfiles_storage. Уменьшенная
+копия (manage.py build_backgrounds) лежит в подкаталоге small/ и показывается
+экранам не шире BACKGROUND_SMALL_WIDTH. Для выбранного фона страница отдаёт
+<link rel=preload> и заголовок Link, чтобы картинка начинала грузиться до
+разбора CSS.
+"""
+
+import posixpath
+import random
+import struct
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+DEFAULT_DIRECTORY = "myapp/image"
+# Совпадает с @media в quote.css и top_quotes.css
+DEFAULT_SMALL_WIDTH = 960
+SMALL_DIRECTORY = "small"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+HEADER_SIZE = 64 * 1024
+
+
+def _jpeg_size(data):
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        # SOF0..SOF15 без DHT, JPG и DAC: в них высота и ширина кадра
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5 : offset + 9])
+            return width, height
+        (length,) = struct.unpack(">H", data[offset + 2 : offset + 4])
+        offset += 2 + length
+    return None
+
+
+def image_size(data):
+    """(ширина, высота) по началу файла JPEG, PNG, GIF или WebP; иначе None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(data[24:27], "little") + 1
+            height = int.from_bytes(data[27:30], "little") + 1
+            return width, height
+    return None
+
+
+class Background:
+    """Фон: URL с хэшем, размеры и, если собрана, уменьшенная копия"""
+
+    def __init__(self, name, url, size, path=None, small=None):
+        self.name = name
+        self.url = url
+        self.width, self.height = size or (None, None)
+        self.path = path
+        self.small = small
+
+    def __str__(self):
+        return self.name
+
+    def preload_links(self):
+        """[(url, media)] для <link rel=preload>: ровно то, что применит CSS"""
+        if self.small is None:
+            return [(self.url, "")]
+        width = small_width()
+        return [
+            (self.small.url, f"(max-width: {width}px)"),
+            (self.url, f"(min-width: {width + 1}px)"),
+        ]
+
+    def link_header(self):
+        links = []
+        for url, media in self.preload_links():
+            link = f"<{url}>; rel=preload; as=image"
+            if media:
+                link += f'; media="{media}"'
+            links.append(link)
+        return ", ".join(links)
+
+
+def small_width():
+    return getattr(settings, "BACKGROUND_SMALL_WIDTH", DEFAULT_SMALL_WIDTH)
+
+
+def _read_header(storage, path):
+    with storage.open(path) as handle:
+        return handle.read(HEADER_SIZE)
+
+
+def _local_path(storage, path):
+    try:
+        return storage.path(path)
+    except NotImplementedError:
+        return None
+
+
+def discover(directory=None):
+    """Ищет фоны в directory среди всей статики: {имя: Background}"""
+    directory = (
+        directory or getattr(settings, "BACKGROUND_IMAGE_DIR", DEFAULT_DIRECTORY)
+    ).strip("/")
+    small_directory = f"{directory}/{SMALL_DIRECTORY}"
+    originals, smalls = {}, {}
+    for finder in finders.get_finders():
+        for path, storage in finder.list(["CVS", ".*", "*~"]):
+            # Имя в статике: путь в хранилище finder'а с его префиксом
+            prefix = getattr(storage, "prefix", None)
+            name = path.replace("\\", "/")
+            if prefix:
+                name = f"{prefix}/{name}"
+            folder, filename = posixpath.split(name)
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            target = {directory: originals, small_directory: smalls}.get(folder)
+            # Первый найденный файл перекрывает следующие, как в collectstatic
+            if target is None or filename in target:
+                continue
+            target[filename] = Background(
+                name,
+                staticfiles_storage.url(name),
+                image_size(_read_header(storage, path)),
+                _local_path(storage, path),
+            )
+    for filename, background in originals.items():
+        background.small = smalls.get(filename)
+    return dict(sorted(originals.items()))
+
+
+class BackgroundManifest:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backgrounds = None
+
+    def all(self):
+        backgrounds = self._backgrounds
+        if backgrounds is None:
+            with self._lock:
+                if self._backgrounds is None:
+                    self._backgrounds = list(discover().values())
+                backgrounds = self._backgrounds
+        return backgrounds
+
+    def choose(self):
+        backgrounds = self.all()
+        return random.choice(backgrounds) if backgrounds else None
+
+    def reset(self):
+        with self._lock:
+            self._backgrounds = None
+
+
+manifest = BackgroundManifest()
+
+
+def all_backgrounds():
+    return manifest.all()
+
+
+def choose():
+    """Случайный фон или None, если картинок нет"""
+    return manifest.choose()
+
+
+def reset():
+    """Забывает манифест: следующий запрос заново обойдёт статику"""
+    manifest.reset()
@@ -0,0 +1,90 @@
+import sqlite3
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .models import Quote
+
+COUNTER_FIELDS = ("views", "likes", "dislikes")
+DEFAULT_LOCK_RETRIES = 3
+# Пауза перед первым повтором; дальше удваивается
+LOCK_RETRY_DELAY = 0.05
+
+
+def _supports_update_returning():
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _update_returning(quote_id, field, amount):
+    qn = connection.ops.quote_name
+    opts = Quote._meta
+    column = qn(opts.get_field(field).column)
+    is_active = qn(opts.get_field("is_active").column)
+    pk = opts.pk
+    sql = (
+        f"UPDATE {qn(opts.db_table)} SET {column} = {column} + %s "
+        f"WHERE {qn(pk.column)} = %s AND {is_active} = %s "
+        f"RETURNING {column}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [amount, pk.get_db_prep_value(quote_id, connection), True])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _increment_once(quote_id, field, amount):
+    if _supports_update_returning():
+        return _update_returning(quote_id, field, amount)
+
+    with transaction.atomic():
+        updated = Quote.objects.filter(pk=quote_id).update(**{field: F(field) + amount})
+        if not updated:
+            return None
+        return Quote.objects.filter(pk=quote_id).values_list(field, flat=True).get()
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def increment(quote_id, field, amount=1):
+    """Атомарно увеличивает счётчик активной цитаты и возвращает новое значение.
+
+    Обходит Quote.save()/full_clean(): счётчики не участвуют в валидации.
+    Возвращает None, если активной цитаты с таким id нет. Если SQLite не
+    дождалась блокировки за busy_timeout, запись повторяется с паузой;
+    внутри внешней транзакции повторять нельзя, и ошибка пробрасывается.
+    """
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f"Неизвестный счётчик: {field}")
+
+    retries = getattr(settings, "COUNTER_LOCK_RETRIES", DEFAULT_LOCK_RETRIES)
+    for attempt in range(retries + 1):
+        try:
+            return _increment_once(quote_id, field, amount)
+        except OperationalError as error:
+            if (
+                attempt == retries
+                or connection.in_atomic_block
+                or not _is_lock_error(error)
+            ):
+                raise
+        time.sleep(LOCK_RETRY_DELAY * 2**attempt)
+
+
+async def aincrement(quote_id, field, amount=1):
+    """Асинхронный increment.
+
+    У драйверов Django нет асинхронного курсора, поэтому UPDATE ... RETURNING
+    выполняется целиком в одном переходе в поток базы, как и любой запрос
+    асинхронного ORM.
+    """
+    return await sync_to_async(increment)(quote_id, field, amount)
@@ -0,0 +1,58 @@
+import csv
+import json
+
+from .models import Quote
+
+# Первые четыре колонки совпадают с форматом import_quotes
+EXPORT_FIELDS = [
+    ("text", "text"),
+    ("source", "source__name"),
+    ("source_type", "source__source_type__name"),
+    ("weight", "weight"),
+    ("views", "views"),
+    ("likes", "likes"),
+    ("dislikes", "dislikes"),
+    ("is_active", "is_active"),
+    ("created_at", "created_at"),
+    ("id", "id"),
+]
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+def iter_quotes(include_inactive=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Строки цитат с источником и типом: один JOIN, серверный курсор по пачкам"""
+    manager = Quote.all_objects if include_inactive else Quote.objects
+    return (
+        manager.order_by()
+        .values_list(*[lookup for _, lookup in EXPORT_FIELDS])
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + "\n"
+
+
+def iter_export(file_format, **kwargs):
+    serialize = iter_csv if file_format == "csv" else iter_jsonl
+    return serialize(iter_quotes(**kwargs))
@@ -1,6 +1,12 @@
 from django import forms
 
-from .models import Quote, Source, SourceType
+from .models import (
+    MAX_ACTIVE_QUOTES_PER_SOURCE,
+    Quote,
+    Source,
+    SourceType,
+    text_digest,
+)
 
 
 class QuoteForm(forms.ModelForm):
@@ -38,7 +44,7 @@ class QuoteForm(forms.ModelForm):
 
     def clean_text(self):
         text = self.cleaned_data.get("text")
-        if text and Quote.objects.filter(text__iexact=text).exists():
+        if text and Quote.all_objects.filter(text_hash=text_digest(text)).exists():
             raise forms.ValidationError("Цитата с таким текстом уже существует.")
         return text
 
@@ -48,15 +54,15 @@ class QuoteForm(forms.ModelForm):
         source_type = cleaned_data.get("source_type")
 
         if source_name and source_type:
-            existing_quotes = Quote.objects.filter(
-                source__name__iexact=source_name,
-                source__source_type=source_type,
-                is_active=True,
-            ).count()
+            source_is_full = Source.objects.filter(
+                name__iexact=source_name,
+                source_type=source_type,
+                active_quote_count__gte=MAX_ACTIVE_QUOTES_PER_SOURCE,
+            ).exists()
 
-            if existing_quotes >= 3:
+            if source_is_full:
                 raise forms.ValidationError(
-                    f"У источника '{source_name}' (тип: {source_type}) уже есть 3 активные цитаты. Нельзя добавить больше."
+                    f"У источника '{source_name}' (тип: {source_type}) уже есть {MAX_ACTIVE_QUOTES_PER_SOURCE} активные цитаты. Нельзя добавить больше."
                 )
 
         return cleaned_data
@@ -0,0 +1,205 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import Quote
+
+DEFAULT_SIZE = 20
+# Сколько секунд доверять упорядочиванию без перечитывания из базы: голоса,
+# поданные в других воркерах, сюда не приходят.
+DEFAULT_MAX_AGE = 30
+# Версия топа в общем кэше: меняется при любом изменении, видимом на странице
+# топа, и живёт не дольше LEADERBOARD_MAX_AGE, как и сам топ в памяти
+VERSION_KEY = "catalog:leaderboard:version"
+
+
+class Leaderboard:
+    """Топ-K активных цитат по лайкам, поддерживаемый инкрементально"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries = None  # [[likes, id], ...] по убыванию лайков
+        self._loaded_at = 0.0
+
+    def _max_age(self):
+        return getattr(settings, "LEADERBOARD_MAX_AGE", DEFAULT_MAX_AGE)
+
+    def _is_fresh(self):
+        return (
+            self._entries is not None
+            and time.monotonic() - self._loaded_at < self._max_age()
+        )
+
+    def _top_rows(self):
+        return (
+            Quote.objects.filter(is_active=True)
+            .order_by("-likes")
+            .values_list("likes", "id")[: self.size]
+        )
+
+    def _store(self, rows):
+        entries = [[likes, pk] for likes, pk in rows]
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+    def load(self):
+        """Перечитывает топ из базы (частичный индекс по -likes)"""
+        self._store(self._top_rows())
+
+    async def aload(self):
+        self._store([row async for row in self._top_rows()])
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+            self.version += 1
+        self.bump_etag()
+
+    def bump_etag(self):
+        # Случайный токен, а не счётчик: у процессов с кэшем в памяти
+        # одинаковые номера версий означали бы разное содержимое
+        cache.set(VERSION_KEY, uuid.uuid4().hex, self._max_age())
+
+    async def abump_etag(self):
+        await cache.aset(VERSION_KEY, uuid.uuid4().hex, self._max_age())
+
+    def etag(self):
+        """Токен текущей версии топа; не обращается к таблице цитат"""
+        token = cache.get(VERSION_KEY)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not cache.add(VERSION_KEY, token, self._max_age()):
+                token = cache.get(VERSION_KEY, token)
+        return token
+
+    async def aetag(self):
+        token = await cache.aget(VERSION_KEY)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not await cache.aadd(VERSION_KEY, token, self._max_age()):
+                token = await cache.aget(VERSION_KEY, token)
+        return token
+
+    def _check_fresh(self):
+        fresh = self._is_fresh()
+        metrics.record_cache("leaderboard", fresh)
+        return fresh
+
+    def _ids(self):
+        with self._lock:
+            return [pk for _, pk in self._entries or []]
+
+    def ids(self):
+        """Возвращает id цитат топа в порядке убывания лайков"""
+        if not self._check_fresh():
+            self.load()
+        return self._ids()
+
+    async def aids(self):
+        if not self._check_fresh():
+            await self.aload()
+        return self._ids()
+
+    def _record_likes(self, quote_id, likes):
+        with self._lock:
+            entries = self._entries
+            if entries is None:
+                # Топ ещё не загружен: влияние голоса неизвестно
+                return True
+            for entry in entries:
+                if entry[1] == quote_id:
+                    entry[0] = likes
+                    break
+            else:
+                if len(entries) >= self.size and likes <= entries[-1][0]:
+                    return False
+                entries.append([likes, quote_id])
+            entries.sort(key=lambda entry: entry[0], reverse=True)
+            del entries[self.size :]
+            self.version += 1
+            return True
+
+    def record_likes(self, quote_id, likes):
+        """Учитывает новое значение лайков; меняет топ, только если голос на него влияет"""
+        if self._record_likes(quote_id, likes):
+            self.bump_etag()
+
+    async def arecord_likes(self, quote_id, likes):
+        if self._record_likes(quote_id, likes):
+            await self.abump_etag()
+
+    def _is_shown(self, quote_id):
+        with self._lock:
+            entries = self._entries
+            return entries is None or any(entry[1] == quote_id for entry in entries)
+
+    async def arecord_change(self, quote_id):
+        """Другое изменение цитаты (дизлайк): версия меняется, только если она в топе"""
+        if self._is_shown(quote_id):
+            await self.abump_etag()
+
+    def _quotes(self, ids):
+        return (
+            Quote.objects.filter(pk__in=ids)
+            .select_related("source__source_type")
+            .order_by()
+        )
+
+    def _ordered(self, ids, quotes):
+        by_id = {quote.pk: quote for quote in quotes}
+        if len(by_id) != len(ids):
+            # Цитату из топа деактивировали в другом процессе
+            self.invalidate()
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+    def top_quotes(self):
+        """Цитаты топа с источниками одним запросом по первичному ключу"""
+        ids = self.ids()
+        return self._ordered(ids, self._quotes(ids))
+
+    async def atop_quotes(self):
+        ids = await self.aids()
+        return self._ordered(ids, [quote async for quote in self._quotes(ids)])
+
+
+leaderboard = Leaderboard()
+
+
+def record_likes(quote_id, likes):
+    leaderboard.record_likes(quote_id, likes)
+
+
+async def arecord_likes(quote_id, likes):
+    await leaderboard.arecord_likes(quote_id, likes)
+
+
+async def arecord_change(quote_id):
+    await leaderboard.arecord_change(quote_id)
+
+
+def invalidate():
+    leaderboard.invalidate()
+
+
+def etag():
+    return leaderboard.etag()
+
+
+async def aetag():
+    return await leaderboard.aetag()
+
+
+def top_quotes():
+    return leaderboard.top_quotes()
+
+
+async def atop_quotes():
+    return await leaderboard.atop_quotes()
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ...models import Quote, QuoteArchive, Source, SourceArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит давно неактивные цитаты и источники в архивные таблицы "
+        "пачками или возвращает их обратно (--restore)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=90,
+            help="Архивировать строки, неактивные дольше N дней (по умолчанию 90)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Строк в одной транзакции (по умолчанию 1000)",
+        )
+        parser.add_argument(
+            "--restore",
+            nargs="+",
+            metavar="ID",
+            help="Вернуть из архива цитаты или источники с этими id",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+        if options["restore"]:
+            return self.restore(options["restore"])
+
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+        # Сначала цитаты: источник архивируется, только когда на него не
+        # ссылается ни одна цитата рабочей таблицы
+        quotes = self.archive(Quote, cutoff, options["batch_size"])
+        sources = self.archive(Source, cutoff, options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"В архив перенесено цитат: {quotes}, источников: {sources}"
+            )
+        )
+
+    def archive(self, model, cutoff, batch_size):
+        candidates = model.all_objects.archivable().filter(updated_at__lt=cutoff)
+        archived = 0
+        while True:
+            # Каждая пачка — отдельная транзакция: таблица не блокируется надолго
+            batch = list(
+                candidates.order_by().values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                return archived
+            moved = model.all_objects.filter(pk__in=batch).archive()
+            if not moved:
+                return archived
+            archived += moved
+
+    def restore(self, ids):
+        taken = list(
+            QuoteArchive.objects.filter(pk__in=ids)
+            .conflicting()
+            .values_list("pk", flat=True)
+        )
+        for pk in taken:
+            self.stderr.write(
+                f"{pk}: цитата с таким текстом уже есть, осталась в архиве"
+            )
+        try:
+            with transaction.atomic():
+                quotes = QuoteArchive.objects.filter(pk__in=ids).restore()
+                sources = SourceArchive.objects.filter(pk__in=ids).restore()
+        except (ValidationError, IntegrityError) as e:
+            messages = e.messages if isinstance(e, ValidationError) else [str(e)]
+            raise CommandError(f"Не удалось восстановить: {'; '.join(messages)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Восстановлено цитат: {quotes}, источников: {sources}")
+        )
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import Quote, text_digest
+
+
+class Command(BaseCommand):
+    help = "Заполняет хэш нормализованного текста у цитат, где он пуст"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        updated = 0
+        duplicates = []
+        last_pk = None
+
+        while True:
+            queryset = (
+                Quote.all_objects.filter(text_hash__isnull=True)
+                .order_by("pk")
+                .only("pk", "text")
+            )
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            for quote in batch:
+                quote.text_hash = text_digest(quote.text)
+            taken = set(
+                Quote.all_objects.filter(
+                    text_hash__in=[quote.text_hash for quote in batch]
+                ).values_list("text_hash", flat=True)
+            )
+            to_update = []
+            for quote in batch:
+                if quote.text_hash in taken:
+                    duplicates.append(quote)
+                    continue
+                taken.add(quote.text_hash)
+                to_update.append(quote)
+
+            with transaction.atomic():
+                Quote.all_objects.bulk_update(to_update, ["text_hash"])
+            updated += len(to_update)
+
+        for quote in duplicates:
+            self.stderr.write(f"Дубликат после нормализации, пропущен: {quote.pk}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Заполнено хэшей: {updated}, пропущено дубликатов: {len(duplicates)}"
+            )
+        )
@@ -0,0 +1,64 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import backgrounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает уменьшенные копии фонов в подкаталог small/ рядом с "
+        "исходниками (нужен Pillow). После сборки запустите collectstatic"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--width",
+            type=int,
+            default=backgrounds.small_width(),
+            help="Ширина копии в пикселях (по умолчанию BACKGROUND_SMALL_WIDTH)",
+        )
+        parser.add_argument("--quality", type=int, default=80, help="Качество JPEG")
+        parser.add_argument(
+            "--force", action="store_true", help="Пересобрать существующие копии"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise CommandError(
+                "Для уменьшения картинок нужен Pillow: pip install Pillow"
+            )
+
+        width = options["width"]
+        built = skipped = 0
+        for background in backgrounds.discover().values():
+            if background.path is None or not background.width:
+                self.stderr.write(f"{background}: файл не читается, пропущен")
+                continue
+            if background.width <= width:
+                skipped += 1
+                continue
+            folder, filename = os.path.split(background.path)
+            target = os.path.join(folder, backgrounds.SMALL_DIRECTORY, filename)
+            if (
+                not options["force"]
+                and os.path.exists(target)
+                and os.path.getmtime(target) >= os.path.getmtime(background.path)
+            ):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with Image.open(background.path) as image:
+                height = round(image.height * width / image.width)
+                image.resize((width, height), Image.LANCZOS).save(
+                    target, quality=options["quality"], optimize=True
+                )
+            built += 1
+            self.stdout.write(f"{target}: {width}x{height}")
+
+        backgrounds.reset()
+        self.stdout.write(
+            self.style.SUCCESS(f"Собрано копий: {built}, пропущено: {skipped}")
+        )
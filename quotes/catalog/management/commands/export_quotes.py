@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ... import export
+
+
+class Command(BaseCommand):
+    help = "Потоково выгружает каталог цитат в CSV или JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="csv")
+        parser.add_argument("--output", help="Файл для выгрузки, по умолчанию stdout")
+        parser.add_argument("--chunk-size", type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--include-inactive", action="store_true")
+
+    def handle(self, *args, **options):
+        chunks = export.iter_export(
+            options["format"],
+            include_inactive=options["include_inactive"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as handle:
+                handle.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ... import viewcounts
+
+
+class Command(BaseCommand):
+    help = "Принудительно сбрасывает буферы просмотров цитат в базу"
+
+    def handle(self, *args, **options):
+        flushed = viewcounts.flush()
+        viewcounts.request_flush()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Записано просмотров из текущего процесса: {flushed}. "
+                "Воркеры сбросят свои буферы на ближайшем запросе."
+            )
+        )
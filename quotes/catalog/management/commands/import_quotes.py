@@ -0,0 +1,243 @@
+import csv
+import json
+import time
+from collections import Counter, OrderedDict
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...models import (
+    MAX_ACTIVE_QUOTES_PER_SOURCE,
+    Quote,
+    Source,
+    SourceType,
+    text_digest,
+)
+
+# Сколько источников держать в памяти между пачками
+SOURCE_CACHE_SIZE = 50_000
+SOURCE_IS_FULL = f"у источника уже {MAX_ACTIVE_QUOTES_PER_SOURCE} активные цитаты"
+
+
+class InvalidRow:
+    """Строка файла, которая не разбирается в объект; уходит в отклонённые"""
+
+    def __init__(self, raw, reason):
+        self.raw = raw
+        self.reason = reason
+
+
+def read_rows(path, file_format):
+    """Построчно читает файл, не загружая его в память целиком.
+
+    Отдаёт пары (номер строки в файле, строка).
+    """
+    with open(path, encoding="utf-8", newline="") as handle:
+        if file_format == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield number, InvalidRow(line.rstrip("\r\n"), "неверный JSON")
+                continue
+            if isinstance(row, dict):
+                yield number, row
+            else:
+                yield number, InvalidRow(row, "строка не объект JSON")
+
+
+class SourceCache:
+    """Кэш типов источников и источников с ограниченным числом записей"""
+
+    def __init__(self, max_size=SOURCE_CACHE_SIZE):
+        self.max_size = max_size
+        # Имя вида уникально и среди скрытых: get_or_create по активным упал бы
+        self.types = {
+            source_type.name: source_type
+            for source_type in SourceType.all_objects.all()
+        }
+        self.sources = OrderedDict()
+
+    def source_type(self, name):
+        if not name:
+            return None
+        if name not in self.types:
+            self.types[name], _ = SourceType.all_objects.get_or_create(name=name)
+        return self.types[name]
+
+    def resolve(self, keys):
+        """Возвращает {(имя, id типа): Source} и список ещё не сохранённых источников"""
+        missing = {key for key in keys if key not in self.sources}
+        new_sources = []
+        if missing:
+            names = {name for name, _ in missing}
+            for source in Source.all_objects.filter(name__in=names):
+                key = (source.name, source.source_type_id)
+                if key in missing:
+                    self.remember(key, source)
+            for name, type_id in missing:
+                if (name, type_id) not in self.sources:
+                    new_sources.append(Source(name=name, source_type_id=type_id))
+        sources = {key: self.sources[key] for key in keys if key in self.sources}
+        sources.update(
+            {(source.name, source.source_type_id): source for source in new_sources}
+        )
+        return sources, new_sources
+
+    def remember(self, key, source):
+        self.sources[key] = source
+        self.sources.move_to_end(key)
+        while len(self.sources) > self.max_size:
+            self.sources.popitem(last=False)
+
+
+class Command(BaseCommand):
+    help = "Потоково импортирует цитаты из CSV или JSONL (text, source, source_type, weight)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--rejects", type=Path, help="Файл JSONL для отклонённых строк"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+        file_format = options["format"] or (
+            "csv" if path.suffix.lower() == ".csv" else "jsonl"
+        )
+
+        self.cache = SourceCache()
+        self.rejected = Counter()
+        self.rejects_file = (
+            open(options["rejects"], "w", encoding="utf-8")
+            if options["rejects"]
+            else None
+        )
+        imported = 0
+        started = time.monotonic()
+        rows = read_rows(path, file_format)
+        try:
+            while chunk := list(islice(rows, options["chunk_size"])):
+                imported += self.import_chunk(chunk)
+        finally:
+            if self.rejects_file:
+                self.rejects_file.close()
+
+        elapsed = time.monotonic() - started
+        total = imported + sum(self.rejected.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импортировано: {imported} из {total} строк за {elapsed:.1f} с "
+                f"({total / elapsed if elapsed else total:.0f} строк/с)"
+            )
+        )
+        for reason, count in self.rejected.most_common():
+            self.stdout.write(f"  отклонено ({reason}): {count}")
+
+    def reject(self, line, row, reason):
+        self.rejected[reason] += 1
+        if self.rejects_file:
+            record = {"line": line, "reason": reason, "row": row}
+            self.rejects_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def parse(self, chunk):
+        parsed = []
+        for line, row in chunk:
+            if isinstance(row, InvalidRow):
+                self.reject(line, row.raw, row.reason)
+                continue
+            text = (row.get("text") or "").strip()
+            source_name = (row.get("source") or "").strip()
+            try:
+                weight = int(row.get("weight") or 1)
+            except (TypeError, ValueError):
+                weight = 0
+            if not text or not source_name:
+                self.reject(line, row, "нет текста или источника")
+            elif weight < 1:
+                self.reject(line, row, "неверный вес")
+            else:
+                source_type = self.cache.source_type(
+                    (row.get("source_type") or "").strip()
+                )
+                key = (source_name, source_type.pk if source_type else None)
+                parsed.append((line, row, text, text_digest(text), key, weight))
+        return parsed
+
+    @transaction.atomic
+    def import_chunk(self, chunk):
+        parsed = self.parse(chunk)
+        if not parsed:
+            return 0
+
+        taken = set(
+            Quote.all_objects.filter(
+                text_hash__in=[text_hash for *_, text_hash, _, _ in parsed]
+            ).values_list("text_hash", flat=True)
+        )
+        sources, new_sources = self.cache.resolve({key for *_, key, _ in parsed})
+        free = dict(
+            Source.all_objects.filter(
+                pk__in=[source.pk for source in sources.values()]
+            ).values_list("pk", "active_quote_count")
+        )
+        free = {
+            source.pk: MAX_ACTIVE_QUOTES_PER_SOURCE - free.get(source.pk, 0)
+            for source in sources.values()
+        }
+
+        accepted = []
+        for line, row, text, text_hash, key, weight in parsed:
+            source = sources[key]
+            if text_hash in taken:
+                self.reject(line, row, "дубликат текста")
+            elif free.get(source.pk, 0) <= 0:
+                self.reject(line, row, SOURCE_IS_FULL)
+            else:
+                taken.add(text_hash)
+                free[source.pk] -= 1
+                accepted.append(
+                    (
+                        line,
+                        row,
+                        Quote(
+                            text=text, text_hash=text_hash, source=source, weight=weight
+                        ),
+                    )
+                )
+
+        # Новые источники создаются сразу с итоговым счётчиком. У существующих
+        # места занимаются условным UPDATE: параллельная запись могла успеть
+        # раньше, тогда строки этого источника отклоняются.
+        per_source = Counter(quote.source_id for _, _, quote in accepted)
+        for source in new_sources:
+            source.active_quote_count = per_source.pop(source.pk, 0)
+        new_sources = [source for source in new_sources if source.active_quote_count]
+        Source.objects.bulk_create(new_sources)
+        for source in new_sources:
+            self.cache.remember((source.name, source.source_type_id), source)
+        full = {
+            source_id
+            for source_id, count in per_source.items()
+            if not Source.reserve_quote_slots(source_id, count)
+        }
+        quotes = []
+        for line, row, quote in accepted:
+            if quote.source_id in full:
+                self.reject(line, row, SOURCE_IS_FULL)
+            else:
+                quotes.append(quote)
+        Quote.objects.bulk_create(quotes)
+        return len(quotes)
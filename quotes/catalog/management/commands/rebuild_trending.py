@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ... import trending
+from ...models import QuoteActivity
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает оценки трендов из почасовых сводок и удаляет старые "
+        "сводки. События, записанные во время пересчёта, могут не попасть в "
+        "оценки до следующего пересчёта"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune-older-than",
+            type=int,
+            metavar="DAYS",
+            help="Удалить сводки старше DAYS дней",
+        )
+
+    def handle(self, *args, **options):
+        trending.flush()
+        days = options["prune_older_than"]
+        if days is not None:
+            cutoff = timezone.now() - timedelta(days=days)
+            pruned, _ = QuoteActivity.objects.filter(hour__lt=cutoff).delete()
+            self.stdout.write(f"Удалено сводок: {pruned}")
+        rebuilt = trending.rebuild_scores()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано оценок: {rebuilt}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ...models import MAX_ACTIVE_QUOTES_PER_SOURCE, Quote, Source
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики активных цитат у источников по таблице цитат"
+
+    def handle(self, *args, **options):
+        active_quotes = (
+            Quote.objects.filter(source=OuterRef("pk"))
+            .order_by()
+            .values("source")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        updated = Source.all_objects.update(
+            active_quote_count=Coalesce(
+                Subquery(active_quotes, output_field=IntegerField()), 0
+            )
+        )
+        over_limit = Source.all_objects.filter(
+            active_quote_count__gt=MAX_ACTIVE_QUOTES_PER_SOURCE
+        ).count()
+
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано источников: {updated}"))
+        if over_limit:
+            self.stderr.write(
+                f"Источников сверх лимита {MAX_ACTIVE_QUOTES_PER_SOURCE}: {over_limit}"
+            )
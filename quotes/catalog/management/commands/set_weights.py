@@ -0,0 +1,46 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import weights
+from ...models import Quote
+
+
+class Command(BaseCommand):
+    help = (
+        "Массово меняет веса цитат из CSV с колонками id и weight "
+        "(подходит и файл export_quotes --format csv)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV-файл с заголовком")
+
+    def handle(self, *args, **options):
+        pk_field = Quote._meta.pk
+        weight_field = Quote._meta.get_field("weight")
+        new_weights = {}
+        rejected = 0
+        try:
+            with open(options["path"], encoding="utf-8", newline="") as handle:
+                reader = csv.DictReader(handle)
+                if not {"id", "weight"} <= set(reader.fieldnames or ()):
+                    raise CommandError("В CSV нужны колонки id и weight")
+                for line, row in enumerate(reader, start=2):
+                    try:
+                        pk = pk_field.to_python(row["id"])
+                        new_weights[pk] = weight_field.clean(row["weight"], None)
+                    except ValidationError as e:
+                        rejected += 1
+                        self.stderr.write(f"Строка {line}: {'; '.join(e.messages)}")
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать {options['path']}: {e}")
+
+        updated, missing = weights.set_weights(new_weights)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Изменено весов: {updated}, без изменений: "
+                f"{len(new_weights) - updated - len(missing)}, "
+                f"не найдено цитат: {len(missing)}, отклонено строк: {rejected}"
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+MODES = ("WAL", "DELETE")
+
+
+class Command(BaseCommand):
+    help = (
+        "Переключает режим журнала базы SQLite. Режим хранится в самом файле "
+        "базы, поэтому задаётся один раз при развёртывании, а не при каждом "
+        "соединении (SQLITE_PRAGMAS)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "mode",
+            nargs="?",
+            default="WAL",
+            choices=MODES,
+            help="WAL — читатели не ждут запись счётчиков (по умолчанию)",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError(f"{options['database']}: база не SQLite")
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {options['mode']}")
+            (mode,) = cursor.fetchone()
+        if mode.upper() != options["mode"]:
+            # Например, база в памяти остаётся в режиме memory
+            raise CommandError(f"SQLite оставила режим журнала {mode}")
+        self.stdout.write(self.style.SUCCESS(f"Режим журнала: {mode}"))
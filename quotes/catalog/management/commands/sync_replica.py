@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ... import routers
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в реплику для чтения. Заменяет "
+        "репликацию при локальной проверке: QUOTES_REPLICA_DB=replica.sqlite3"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Повторять копирование каждые N секунд (0 — один раз)",
+        )
+
+    def handle(self, *args, **options):
+        alias = routers.replica_alias()
+        if not alias or alias not in connections.settings:
+            raise CommandError(
+                "Реплика не настроена: задайте QUOTES_REPLICA_DB с путём к файлу"
+            )
+        source, target = connections["default"], connections[alias]
+        if source.vendor != "sqlite" or target.vendor != "sqlite":
+            raise CommandError("sync_replica копирует только базы SQLite")
+
+        while True:
+            started = time.perf_counter()
+            source.ensure_connection()
+            target.ensure_connection()
+            # Онлайн-бэкап SQLite: писатели основной базы не блокируются
+            source.connection.backup(target.connection)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Реплика {target.settings_dict['NAME']} обновлена "
+                    f"за {time.perf_counter() - started:.2f} с"
+                )
+            )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
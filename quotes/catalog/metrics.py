@@ -0,0 +1,220 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Каждый поток пишет в свой шард без блокировок; блокировка берётся только
+при появлении и завершении потока и при сборе метрик на /metrics. Шард
+завершившегося потока складывается в общий итог и удаляется, поэтому число
+шардов не растёт вместе с числом когда-либо созданных потоков.
+"""
+
+import threading
+import weakref
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    """Метка потока, по сборке которой шард потока считается завершённым"""
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}  # итог шардов завершившихся потоков
+        # Повторно входимая: сборщик мусора может завершить поток под блокировкой
+        self._lock = threading.RLock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            # Владелец живёт только в локальных данных потока и умирает вместе
+            # с потоком; тогда шард переносится в итог
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            # Шарды сравниваются по содержимому, поэтому ищем по тождеству
+            self._shards = [other for other in self._shards if other is not shard]
+            self._merge(self._retired, shard.items())
+
+    def _merge(self, totals, items):
+        raise NotImplementedError
+
+    def values(self):
+        totals = {}
+        with self._lock:
+            self._merge(totals, self._retired.items())
+            shards = list(self._shards)
+        for shard in shards:
+            self._merge(totals, list(shard.items()))
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards:
+                shard.clear()
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, totals, items):
+        for labels, value in items:
+            totals[labels] = totals.get(labels, 0) + value
+
+    def collect(self):
+        lines = self.header()
+        for labels, value in sorted(self.values().items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(Metric):
+    """Значение, вычисляемое при сборе метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def collect(self):
+        return self.header() + [f"{self.name} {_format_value(self.callback())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [счётчики по корзинам..., сумма, количество]
+            state = shard[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[index] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    def _merge(self, totals, items):
+        for labels, state in items:
+            total = totals.setdefault(labels, [0] * len(state))
+            for index, value in enumerate(list(state)):
+                total[index] += value
+
+    def collect(self):
+        lines = self.header()
+        for labels, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            inf = _format_labels(self.labelnames, labels, [("le", "+Inf")])
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_bucket{inf} {state[-1]}")
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(
+    Histogram(
+        "catalog_request_duration_seconds",
+        "Время обработки запроса по имени URL",
+        ["view"],
+    )
+)
+request_db_duration = registry.register(
+    Histogram(
+        "catalog_request_db_seconds",
+        "Время запросов к базе за один HTTP-запрос по имени URL",
+        ["view"],
+    )
+)
+request_queries = registry.register(
+    Counter("catalog_db_queries_total", "Число SQL-запросов по имени URL", ["view"])
+)
+cache_requests = registry.register(
+    Counter(
+        "catalog_cache_requests_total",
+        "Обращения к in-memory структурам: hit — без перестройки",
+        ["cache", "result"],
+    )
+)
+view_flush_lag = registry.register(
+    Histogram(
+        "catalog_view_flush_lag_seconds",
+        "Задержка между первым несброшенным просмотром и записью буфера",
+        buckets=LAG_BUCKETS,
+    )
+)
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache, "hit" if hit else "miss")
@@ -0,0 +1,240 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, routers, timing
+
+logger = logging.getLogger("catalog.timing")
+
+DEFAULT_QUERY_BUDGET = 10
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Ключ сессии со временем последней записи в хранилище
+SESSION_REFRESHED_AT_KEY = "_refreshed_at"
+DEFAULT_SESSION_REFRESH_INTERVAL = 24 * 60 * 60
+# Страницы, где анонимному читателю сессия не нужна
+SESSIONLESS_VIEWS = {"random_quote_view", "top_quotes", "trending"}
+
+
+class AsyncCapableMiddleware:
+    """Основа middleware, которое работает и в WSGI, и в ASGI без адаптеров.
+
+    Под ASGI синхронное middleware заставило бы Django выполнять асинхронные
+    представления через async_to_sync в отдельном потоке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, state = self.before(request)
+        try:
+            with timing.collect_queries(timings):
+                response = self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, timings, state)
+
+    async def __acall__(self, request):
+        timings, state = self.before(request)
+        try:
+            with timing.collect_queries(timings):
+                response = await self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, timings, state)
+
+    def before(self, request):
+        return timing.RequestTimings(), time.perf_counter()
+
+    def cleanup(self, state):
+        pass
+
+    def after(self, request, response, timings, started):
+        raise NotImplementedError
+
+
+class RequestTimingMiddleware(AsyncCapableMiddleware):
+    """Замеры запросов к базе, рендеринга и выборки цитаты с заголовком Server-Timing.
+
+    Включается настройкой REQUEST_TIMING_ENABLED; если она выключена, Django
+    исключает middleware из цепочки и накладных расходов нет.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TIMING_ENABLED", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.query_budget = getattr(
+            settings, "REQUEST_QUERY_BUDGET", DEFAULT_QUERY_BUDGET
+        )
+
+    def before(self, request):
+        timings = timing.RequestTimings()
+        return timings, (timing.activate(timings), time.perf_counter())
+
+    def cleanup(self, state):
+        timing.deactivate(state[0])
+
+    def after(self, request, response, timings, state):
+        total = time.perf_counter() - state[1]
+        response["Server-Timing"] = self.server_timing(timings, total)
+        self.log(request, response, timings, total)
+        return response
+
+    def server_timing(self, timings, total):
+        metrics = [
+            f'db;dur={timings.durations["db"] * 1000:.2f};desc="{timings.queries} queries"'
+        ]
+        for name, seconds in timings.durations.items():
+            if name != "db":
+                metrics.append(f"{name};dur={seconds * 1000:.2f}")
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def log(self, request, response, timings, total):
+        match = getattr(request, "resolver_match", None)
+        over_budget = timings.queries > self.query_budget
+        record = {
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "over_query_budget": over_budget,
+            "total_ms": round(total * 1000, 2),
+            **{
+                f"{name}_ms": round(seconds * 1000, 2)
+                for name, seconds in timings.durations.items()
+            },
+        }
+        level = logging.WARNING if over_budget else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """Гистограммы времени ответа и времени базы по имени URL для /metrics.
+
+    Пишет в шарды текущего потока без блокировок; выключается настройкой
+    METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def after(self, request, response, timings, started):
+        total = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name if match else None) or "unmatched"
+        metrics.request_duration.observe(total, view)
+        metrics.request_db_duration.observe(timings.durations["db"], view)
+        metrics.request_queries.inc(view, amount=timings.queries)
+        return response
+
+
+class ReadReplicaMiddleware:
+    """Закрепляет пользователя за основной базой после записи.
+
+    Небезопасные запросы (голоса, добавление цитат, сохранение в админке)
+    читают только с default и ставят cookie, по которой следующие
+    READ_REPLICA_PIN_SECONDS запросы тоже идут мимо реплики.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(
+            settings, "READ_REPLICA_PIN_SECONDS", routers.DEFAULT_PIN_SECONDS
+        )
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_pinned(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            return float(request.COOKIES.get(routers.PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and routers.replica_alias():
+            response.set_cookie(
+                routers.PIN_COOKIE,
+                str(time.time() + self.pin_seconds),
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_pinned(request):
+            return self.get_response(request)
+        with routers.pinned_to_primary():
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        if not self.is_pinned(request):
+            return await self.get_response(request)
+        with routers.pinned_to_primary():
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+
+class SlidingSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware, который пишет сессию только при необходимости.
+
+    Заменяет SESSION_SAVE_EVERY_REQUEST: сессия сохраняется, если изменились
+    данные или с последней записи прошло SESSION_REFRESH_INTERVAL секунд.
+    Срок жизни по-прежнему скользящий (SESSION_COOKIE_AGE от последней
+    записи), но вошедший пользователь продлевает его раз в интервал, а не
+    на каждом запросе. Анонимным GET страниц цитат сессия не создаётся.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if session is None:
+            return response
+        if self.is_sessionless(request, session):
+            return response
+        if not session.is_empty() and (session.modified or self.refresh_due(session)):
+            # Изменённая или продлеваемая сессия сохраняется вместе с меткой
+            session[SESSION_REFRESHED_AT_KEY] = int(time.time())
+        return super().process_response(request, response)
+
+    def is_sessionless(self, request, session):
+        match = getattr(request, "resolver_match", None)
+        return (
+            request.method in SAFE_METHODS
+            and session.session_key is None
+            and match is not None
+            and match.url_name in SESSIONLESS_VIEWS
+        )
+
+    def refresh_due(self, session):
+        if not session.accessed:
+            return False
+        interval = getattr(
+            settings, "SESSION_REFRESH_INTERVAL", DEFAULT_SESSION_REFRESH_INTERVAL
+        )
+        refreshed_at = session.get(SESSION_REFRESHED_AT_KEY, 0)
+        return time.time() - refreshed_at >= interval
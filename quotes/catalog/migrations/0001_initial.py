@@ -0,0 +1,161 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import django.db.models.deletion
+import django.db.models.manager
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="SourceType",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создан"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлён"),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255,
+                        unique=True,
+                        verbose_name="Вид источника: фильм, книга и тп",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Вид источника",
+                "verbose_name_plural": "Виды источников",
+                "ordering": ["-created_at"],
+            },
+            managers=[
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Source",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создан"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлён"),
+                ),
+                ("name", models.TextField(verbose_name="Название источника")),
+                (
+                    "source_type",
+                    models.ForeignKey(
+                        max_length=255,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="catalog.sourcetype",
+                        verbose_name="Вид источника: фильм, книга и тп",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Источник",
+                "verbose_name_plural": "Источники",
+                "ordering": ["-created_at"],
+                "unique_together": {("name", "source_type")},
+            },
+            managers=[
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Quote",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создан"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлён"),
+                ),
+                ("text", models.TextField(unique=True, verbose_name="Цитата")),
+                (
+                    "weight",
+                    models.PositiveIntegerField(
+                        default=1, verbose_name="Вес (влияет на частоту показа)"
+                    ),
+                ),
+                (
+                    "views",
+                    models.PositiveIntegerField(default=0, verbose_name="Просмотры"),
+                ),
+                ("likes", models.IntegerField(default=0, verbose_name="Лайки")),
+                ("dislikes", models.IntegerField(default=0, verbose_name="Дизлайки")),
+                (
+                    "source",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="catalog.source",
+                        verbose_name="Источник",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Цитата",
+                "verbose_name_plural": "Цитаты",
+                "ordering": ["-created_at"],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(("likes__gte", 0)), name="likes_gte0"
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(("dislikes__gte", 0)), name="dislikes_gte0"
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(("views__gte", 0)), name="views_gte0"
+                    ),
+                ],
+            },
+            managers=[
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,12 @@
+# Схема 0001–0003 не сохранилась в репозитории; 0001_initial восстановлен по
+# моделям, а эта миграция оставлена пустой под тем же именем, чтобы базы, где
+# 0001–0003 уже применены (в том числе quotes/db.sqlite3), продолжали с 0004
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0001_initial"),
+    ]
+
+    operations = []
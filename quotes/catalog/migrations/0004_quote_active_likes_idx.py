@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0003_alter_source_source_type"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="quote",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-likes"],
+                name="quote_active_likes_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def text_digest(text):
+    # Копия catalog.models.text_digest на момент миграции
+    normalized = " ".join(text.casefold().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def fill_text_hash(apps, schema_editor):
+    """Заполняет хэши до уникального индекса; дубликаты после нормализации
+    остаются с NULL, как в manage.py backfill_text_hash"""
+    Quote = apps.get_model("catalog", "Quote")
+    taken = set()
+    batch = []
+    for quote in Quote._base_manager.order_by("created_at", "pk").only("pk", "text"):
+        digest = text_digest(quote.text)
+        if digest in taken:
+            continue
+        taken.add(digest)
+        quote.text_hash = digest
+        batch.append(quote)
+        if len(batch) >= BATCH_SIZE:
+            Quote._base_manager.bulk_update(batch, ["text_hash"])
+            batch = []
+    Quote._base_manager.bulk_update(batch, ["text_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_quote_active_likes_idx"),
+    ]
+
+    operations = [
+        # Сначала без уникальности: у существующих строк хэша ещё нет
+        migrations.AddField(
+            model_name="quote",
+            name="text_hash",
+            field=models.CharField(
+                editable=False,
+                max_length=64,
+                null=True,
+                verbose_name="Хэш нормализованного текста",
+            ),
+        ),
+        migrations.RunPython(fill_text_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="quote",
+            name="text_hash",
+            field=models.CharField(
+                editable=False,
+                error_messages={"unique": "Цитата с таким текстом уже существует."},
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="Хэш нормализованного текста",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="quote",
+            name="text",
+            field=models.TextField(verbose_name="Цитата"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_quotes(apps, schema_editor):
+    """Начальные значения счётчика, как у manage.py recount_active_quotes"""
+    Quote = apps.get_model("catalog", "Quote")
+    Source = apps.get_model("catalog", "Source")
+    active_quotes = (
+        Quote._base_manager.filter(source=OuterRef("pk"), is_active=True)
+        .order_by()
+        .values("source")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Source._base_manager.update(
+        active_quote_count=Coalesce(
+            Subquery(active_quotes, output_field=IntegerField()), 0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_quote_text_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="source",
+            name="active_quote_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Активных цитат"
+            ),
+        ),
+        migrations.RunPython(count_active_quotes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_source_active_quote_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="quote",
+            index=models.Index(fields=["-created_at", "-id"], name="quote_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="quote",
+            index=models.Index(fields=["text"], name="quote_text_idx"),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_quote_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuoteArchive",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Создан")),
+                ("updated_at", models.DateTimeField(verbose_name="Удалён")),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Архивирован"),
+                ),
+                ("text", models.TextField(verbose_name="Цитата")),
+                (
+                    "text_hash",
+                    models.CharField(db_index=True, max_length=64, null=True),
+                ),
+                ("source_id", models.UUIDField(db_index=True, verbose_name="Источник")),
+                ("weight", models.PositiveIntegerField(default=1, verbose_name="Вес")),
+                (
+                    "views",
+                    models.PositiveIntegerField(default=0, verbose_name="Просмотры"),
+                ),
+                ("likes", models.IntegerField(default=0, verbose_name="Лайки")),
+                ("dislikes", models.IntegerField(default=0, verbose_name="Дизлайки")),
+            ],
+            options={
+                "verbose_name": "Архивная цитата",
+                "verbose_name_plural": "Архивные цитаты",
+                "ordering": ["-archived_at"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="SourceArchive",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Создан")),
+                ("updated_at", models.DateTimeField(verbose_name="Удалён")),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Архивирован"),
+                ),
+                ("name", models.TextField(verbose_name="Название источника")),
+                (
+                    "source_type_id",
+                    models.UUIDField(null=True, verbose_name="Вид источника"),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивный источник",
+                "verbose_name_plural": "Архивные источники",
+                "ordering": ["-archived_at"],
+                "abstract": False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name="quote",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["id", "weight"],
+                name="quote_active_weight_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="source",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["name", "source_type"],
+                name="source_active_name_idx",
+            ),
+        ),
+    ]
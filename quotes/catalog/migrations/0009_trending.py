@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "quote",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="catalog.quote",
+                        verbose_name="Цитата",
+                    ),
+                ),
+                ("score", models.FloatField(default=0.0, verbose_name="Оценка")),
+                ("era", models.IntegerField(default=0, verbose_name="Эпоха")),
+            ],
+            options={
+                "verbose_name": "Оценка тренда",
+                "verbose_name_plural": "Оценки трендов",
+                "indexes": [
+                    models.Index(
+                        fields=["era", "-score"], name="trending_era_score_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="QuoteActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField(verbose_name="Час")),
+                (
+                    "views",
+                    models.PositiveIntegerField(default=0, verbose_name="Просмотры"),
+                ),
+                ("likes", models.PositiveIntegerField(default=0, verbose_name="Лайки")),
+                (
+                    "dislikes",
+                    models.PositiveIntegerField(default=0, verbose_name="Дизлайки"),
+                ),
+                (
+                    "quote",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity",
+                        to="catalog.quote",
+                        verbose_name="Цитата",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Активность за час",
+                "verbose_name_plural": "Активность по часам",
+                "ordering": ["-hour"],
+                "indexes": [models.Index(fields=["hour"], name="activity_hour_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("quote", "hour"), name="activity_quote_hour_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,8 +1,28 @@
+import hashlib
 import uuid
 
+from django.apps import apps
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import QuerySet
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, QuerySet
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+
+MAX_ACTIVE_QUOTES_PER_SOURCE = 3
+
+# Массовые update() не отправляют post_save, поэтому мягкое удаление и
+# восстановление через QuerySet сообщают об изменении отдельным сигналом.
+soft_delete_changed = Signal()
+
+
+def normalize_text(text):
+    """Приводит текст цитаты к виду для сравнения: регистр и пробелы не важны"""
+    return " ".join(text.casefold().split())
+
+
+def text_digest(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
 
 
 class SoftDeleteQuerySet(QuerySet):
@@ -15,13 +35,51 @@ class SoftDeleteQuerySet(QuerySet):
         return self.filter(is_active=False)
 
     def delete(self):
-        return self.update(is_active=False)
+        # updated_at отмечает момент удаления: по нему архивируются старые строки
+        updated = self.update(is_active=False, updated_at=timezone.now())
+        soft_delete_changed.send(sender=self.model)
+        return updated
 
     def hard_delete(self):
         return super().delete()
 
     def restore(self):
-        return self.update(is_active=True)
+        updated = self.update(is_active=True, updated_at=timezone.now())
+        soft_delete_changed.send(sender=self.model)
+        return updated
+
+    def archivable(self):
+        """Неактивные строки, на которые не ссылаются строки рабочих таблиц.
+
+        Производные таблицы без мягкого удаления (сводки активности, рейтинг
+        трендов) архивированию не мешают: их строки удаляются каскадом.
+        """
+        queryset = self.filter(is_active=False)
+        for relation in self.model._meta.related_objects:
+            if relation.one_to_many and issubclass(relation.related_model, BaseModel):
+                referencing = relation.related_model._base_manager.filter(
+                    **{relation.field.name: OuterRef("pk")}
+                )
+                queryset = queryset.exclude(Exists(referencing))
+        return queryset
+
+    def archive(self):
+        """Переносит неактивные строки в архивную таблицу модели.
+
+        Активные строки и строки, на которые ещё ссылаются, остаются на месте.
+        Возвращает число перенесённых строк.
+        """
+        archive_model = apps.get_model(self.model.archive_model)
+        fields = archive_model.copied_fields()
+        with transaction.atomic():
+            rows = list(self.archivable().values(*fields))
+            if not rows:
+                return 0
+            archive_model.objects.bulk_create(archive_model(**row) for row in rows)
+            self.model.all_objects.filter(
+                pk__in=[row["id"] for row in rows]
+            ).hard_delete()
+        return len(rows)
 
 
 class BaseManager(models.Manager):
@@ -38,8 +96,8 @@ class BaseModel(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлён")
-    all_objects = models.Manager()
-    objects = BaseManager()
+    all_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()
+    objects = BaseManager.from_queryset(SoftDeleteQuerySet)()
 
     class Meta:
         abstract = True
@@ -47,7 +105,7 @@ class BaseModel(models.Model):
 
     def delete(self, *args, **kwargs):
         self.is_active = False
-        self.save(update_fields=["is_active"])
+        self.save(update_fields=["is_active", "updated_at"])
 
 
 class SourceType(BaseModel):
@@ -75,21 +133,87 @@ class Source(BaseModel):
         on_delete=models.SET_NULL,
         null=True,
     )
+    active_quote_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Активных цитат"
+    )
+
+    archive_model = "catalog.SourceArchive"
 
     class Meta:
         verbose_name = "Источник"
         verbose_name_plural = "Источники"
         ordering = ["-created_at"]
         unique_together = ["name", "source_type"]
+        indexes = [
+            # Поиск источника по имени среди активных
+            models.Index(
+                fields=["name", "source_type"],
+                name="source_active_name_idx",
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def reserve_quote_slots(cls, source_id, count=1):
+        """Атомарно занимает места под активные цитаты; False, если лимит исчерпан"""
+        return bool(
+            cls.all_objects.filter(
+                pk=source_id,
+                active_quote_count__lte=MAX_ACTIVE_QUOTES_PER_SOURCE - count,
+            ).update(active_quote_count=F("active_quote_count") + count)
+        )
+
+    @classmethod
+    def release_quote_slots(cls, source_id, count=1):
+        cls.all_objects.filter(pk=source_id).update(
+            active_quote_count=Greatest(F("active_quote_count") - count, 0)
+        )
+
+
+class QuoteQuerySet(SoftDeleteQuerySet):
+    """QuerySet цитат, поддерживающий счётчики активных цитат у источников"""
+
+    def _count_by_source(self, is_active):
+        return list(
+            self.filter(is_active=is_active)
+            .order_by()
+            .values_list("source")
+            .annotate(count=Count("pk"))
+        )
+
+    def delete(self):
+        with transaction.atomic():
+            counts = self._count_by_source(is_active=True)
+            updated = super().delete()
+            for source_id, count in counts:
+                Source.release_quote_slots(source_id, count)
+        return updated
+
+    def restore(self):
+        with transaction.atomic():
+            for source_id, count in self._count_by_source(is_active=False):
+                if not Source.reserve_quote_slots(source_id, count):
+                    raise ValidationError(
+                        f"У источника {source_id} не хватает мест под активные цитаты."
+                    )
+            return super().restore()
+
 
 class Quote(BaseModel):
     """Модель цитаты"""
 
-    text = models.TextField(verbose_name="Цитата", unique=True)
+    text = models.TextField(verbose_name="Цитата")
+    text_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name="Хэш нормализованного текста",
+        error_messages={"unique": "Цитата с таким текстом уже существует."},
+    )
     source = models.ForeignKey(
         "Source", on_delete=models.CASCADE, verbose_name="Источник"
     )
@@ -99,6 +223,19 @@ class Quote(BaseModel):
     views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
     likes = models.IntegerField(default=0, verbose_name="Лайки")
     dislikes = models.IntegerField(default=0, verbose_name="Дизлайки")
+    all_objects = models.Manager.from_queryset(QuoteQuerySet)()
+    objects = BaseManager.from_queryset(QuoteQuerySet)()
+
+    archive_model = "catalog.QuoteArchive"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = (
+            instance.__dict__.get("is_active"),
+            instance.__dict__.get("source_id"),
+        )
+        return instance
 
     @property
     def truncated_text(self):
@@ -121,17 +258,287 @@ class Quote(BaseModel):
             ),
             models.CheckConstraint(check=models.Q(views__gte=0), name="views_gte0"),
         ]
+        indexes = [
+            # Топ по лайкам читается по индексу, без сортировки всей таблицы
+            models.Index(
+                fields=["-likes"],
+                name="quote_active_likes_idx",
+                condition=models.Q(is_active=True),
+            ),
+            # Таблица взвешенного выбора строится только по индексу активных
+            models.Index(
+                fields=["id", "weight"],
+                name="quote_active_weight_idx",
+                condition=models.Q(is_active=True),
+            ),
+            # Список в админке: сортировка по дате без сортировки всей таблицы
+            models.Index(fields=["-created_at", "-id"], name="quote_created_idx"),
+            # Поиск в админке по началу текста
+            models.Index(fields=["text"], name="quote_text_idx"),
+        ]
+
+    def _previous_state(self):
+        """Активность и источник цитаты в базе до сохранения"""
+        if self._state.adding:
+            return False, None
+        state = getattr(self, "_loaded_state", (None, None))
+        if None in state:
+            state = (
+                Quote.all_objects.filter(pk=self.pk)
+                .values_list("is_active", "source_id")
+                .first()
+            ) or (False, None)
+        return state
+
+    def _next_state(self, update_fields=None):
+        was_active, old_source_id = self._previous_state()
+        is_active, source_id = self.is_active, self.source_id
+        if update_fields is not None:
+            if "is_active" not in update_fields:
+                is_active = was_active
+            if "source" not in update_fields and "source_id" not in update_fields:
+                source_id = old_source_id
+        return (was_active, old_source_id), (is_active, source_id)
+
+    def _needs_slot(self):
+        (was_active, old_source_id), (is_active, source_id) = self._next_state()
+        return (
+            is_active and source_id and (not was_active or old_source_id != source_id)
+        )
 
     def clean(self):
-        if hasattr(self, "source") and self.source and self.is_active:
-            existing_quotes = Quote.objects.filter(source=self.source, is_active=True)
-            if self.pk:
-                existing_quotes = existing_quotes.exclude(pk=self.pk)
-            if existing_quotes.count() >= 3:
+        if self._needs_slot():
+            count = (
+                Source.all_objects.filter(pk=self.source_id)
+                .values_list("active_quote_count", flat=True)
+                .first()
+            )
+            if count is not None and count >= MAX_ACTIVE_QUOTES_PER_SOURCE:
+                raise ValidationError(
+                    f"У источника '{self.source}' уже есть "
+                    f"{MAX_ACTIVE_QUOTES_PER_SOURCE} активные цитаты."
+                )
+
+    def _sync_source_counter(self, update_fields=None):
+        (was_active, old_source_id), (is_active, source_id) = self._next_state(
+            update_fields
+        )
+        moved = old_source_id != source_id
+        if was_active and (not is_active or moved):
+            Source.release_quote_slots(old_source_id)
+        if is_active and (not was_active or moved):
+            # Условный UPDATE: проверка лимита и занятие места одной операцией
+            if not Source.reserve_quote_slots(source_id):
                 raise ValidationError(
-                    f"У источника '{self.source}' уже есть 3 активные цитаты."
+                    f"У источника '{self.source}' уже есть "
+                    f"{MAX_ACTIVE_QUOTES_PER_SOURCE} активные цитаты."
                 )
 
     def save(self, *args, **kwargs):
+        self.text_hash = text_digest(self.text)
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            self._sync_source_counter(kwargs.get("update_fields"))
+            super().save(*args, **kwargs)
+        self._loaded_state = (self.is_active, self.source_id)
+
+
+class ArchiveQuerySet(QuerySet):
+    def conflicting(self):
+        """Строки, уникальные поля которых заняты в рабочей таблице"""
+        return self.none()
+
+    def restore(self):
+        """Возвращает строки в рабочую таблицу и активирует их.
+
+        Активация идёт через SoftDeleteQuerySet.restore рабочей модели, так
+        что для цитат действует лимит активных цитат источника. Строки из
+        conflicting() остаются в архиве. Возвращает число восстановленных
+        строк.
+        """
+        hot_model = apps.get_model(self.model.hot_model)
+        fields = self.model.copied_fields()
+        with transaction.atomic():
+            rows = list(
+                self.exclude(pk__in=self.conflicting().values("pk")).values(*fields)
+            )
+            if not rows:
+                return 0
+            self.model.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+            restored = hot_model.all_objects.bulk_create(
+                hot_model(is_active=False, **row) for row in rows
+            )
+            # bulk_create проставляет created_at заново (auto_now_add)
+            for instance, row in zip(restored, rows):
+                instance.created_at = row["created_at"]
+            hot_model.all_objects.bulk_update(restored, ["created_at"])
+            return hot_model.all_objects.filter(
+                pk__in=[row["id"] for row in rows]
+            ).restore()
+
+
+class ArchiveModel(models.Model):
+    """Строка, вынесенная из рабочей таблицы после долгой неактивности"""
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    created_at = models.DateTimeField(verbose_name="Создан")
+    updated_at = models.DateTimeField(verbose_name="Удалён")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Архивирован")
+
+    objects = ArchiveQuerySet.as_manager()
+
+    hot_model = None
+
+    class Meta:
+        abstract = True
+        ordering = ["-archived_at"]
+
+    @classmethod
+    def copied_fields(cls):
+        """Поля, общие с рабочей моделью, по именам колонок"""
+        return [
+            field.attname
+            for field in cls._meta.concrete_fields
+            if field.name != "archived_at"
+        ]
+
+
+class SourceArchiveQuerySet(ArchiveQuerySet):
+    def _live_twins(self):
+        # unique_together не сравнивает NULL, поэтому источники без вида
+        # конфликтовать не могут
+        return Source.all_objects.filter(
+            name=OuterRef("name"),
+            source_type_id=OuterRef("source_type_id"),
+            source_type__isnull=False,
+        )
+
+    def conflicting(self):
+        return self.filter(Exists(self._live_twins()))
+
+    def restore(self):
+        """Как ArchiveQuerySet.restore, но источник с тем же названием и видом,
+        созданный после архивирования, занимает место архивного: архивные
+        цитаты переходят к нему, а сам он активируется.
+        """
+        with transaction.atomic():
+            twins = list(
+                self.conflicting()
+                .annotate(live_id=self._live_twins().values("pk")[:1])
+                .values_list("pk", "live_id")
+            )
+            for archived_id, live_id in twins:
+                QuoteArchive.objects.filter(source_id=archived_id).update(
+                    source_id=live_id
+                )
+            self.filter(pk__in=[archived_id for archived_id, _ in twins]).delete()
+            merged = Source.all_objects.filter(
+                pk__in=[live_id for _, live_id in twins], is_active=False
+            ).restore()
+            return super().restore() + merged
+
+
+class SourceArchive(ArchiveModel):
+    """Архив источников"""
+
+    name = models.TextField(verbose_name="Название источника")
+    source_type_id = models.UUIDField(null=True, verbose_name="Вид источника")
+
+    objects = SourceArchiveQuerySet.as_manager()
+
+    hot_model = "catalog.Source"
+
+    class Meta(ArchiveModel.Meta):
+        verbose_name = "Архивный источник"
+        verbose_name_plural = "Архивные источники"
+
+
+class QuoteArchiveQuerySet(ArchiveQuerySet):
+    def conflicting(self):
+        """Цитаты, текст которых снова добавили после архивирования"""
+        return self.filter(
+            Exists(Quote.all_objects.filter(text_hash=OuterRef("text_hash")))
+        )
+
+    def restore(self):
+        with transaction.atomic():
+            # Сначала источники, на которые ссылаются восстанавливаемые цитаты
+            source_ids = self.exclude(
+                pk__in=self.conflicting().values("pk")
+            ).values_list("source_id", flat=True)
+            SourceArchive.objects.filter(pk__in=list(source_ids)).restore()
+            return super().restore()
+
+
+class QuoteArchive(ArchiveModel):
+    """Архив цитат"""
+
+    text = models.TextField(verbose_name="Цитата")
+    text_hash = models.CharField(max_length=64, null=True, db_index=True)
+    source_id = models.UUIDField(db_index=True, verbose_name="Источник")
+    weight = models.PositiveIntegerField(default=1, verbose_name="Вес")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    likes = models.IntegerField(default=0, verbose_name="Лайки")
+    dislikes = models.IntegerField(default=0, verbose_name="Дизлайки")
+
+    objects = QuoteArchiveQuerySet.as_manager()
+
+    hot_model = "catalog.Quote"
+
+    class Meta(ArchiveModel.Meta):
+        verbose_name = "Архивная цитата"
+        verbose_name_plural = "Архивные цитаты"
+
+
+class QuoteActivity(models.Model):
+    """Почасовая сводка активности цитаты для рейтинга трендов"""
+
+    quote = models.ForeignKey(
+        Quote,
+        on_delete=models.CASCADE,
+        related_name="activity",
+        verbose_name="Цитата",
+    )
+    hour = models.DateTimeField(verbose_name="Час")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    likes = models.PositiveIntegerField(default=0, verbose_name="Лайки")
+    dislikes = models.PositiveIntegerField(default=0, verbose_name="Дизлайки")
+
+    class Meta:
+        verbose_name = "Активность за час"
+        verbose_name_plural = "Активность по часам"
+        ordering = ["-hour"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quote", "hour"], name="activity_quote_hour_uniq"
+            ),
+        ]
+        indexes = [
+            # Пересчёт рейтинга и очистка читают сводки по времени
+            models.Index(fields=["hour"], name="activity_hour_idx"),
+        ]
+
+
+class TrendingScore(models.Model):
+    """Затухающий рейтинг цитаты, накопленный из почасовых сводок.
+
+    score хранится относительно начала эпохи era (catalog.trending): внутри
+    эпохи оценки сравнимы без пересчёта всех строк.
+    """
+
+    quote = models.OneToOneField(
+        Quote,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name="Цитата",
+    )
+    score = models.FloatField(default=0.0, verbose_name="Оценка")
+    era = models.IntegerField(default=0, verbose_name="Эпоха")
+
+    class Meta:
+        verbose_name = "Оценка тренда"
+        verbose_name_plural = "Оценки трендов"
+        indexes = [
+            models.Index(fields=["era", "-score"], name="trending_era_score_idx"),
+        ]
@@ -0,0 +1,87 @@
+"""Общий кэш отрендеренных страниц с защитой от лавины промахов.
+
+Страница лежит в кэше Django под ключом версии своих данных: новая версия —
+новый ключ, старые записи истекают сами. При промахе рендерит только тот, кто
+взял блокировку через cache.add; остальные запросы ждут готовую страницу до
+PAGE_CACHE_LOCK_WAIT секунд и только потом рендерят сами.
+"""
+
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import metrics
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_LOCK_WAIT = 2
+# Блокировка переживает упавший рендер не дольше этого срока
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.02
+# Заголовки, которые отдаются вместе с закэшированным телом
+STORED_HEADERS = ("Content-Type", "Link")
+
+
+def _key(name, version):
+    return f"catalog:page:{name}:{version}"
+
+
+def _freeze(response):
+    return {
+        "content": response.content,
+        "headers": {
+            header: response[header]
+            for header in STORED_HEADERS
+            if response.has_header(header)
+        },
+    }
+
+
+def _thaw(frozen):
+    response = HttpResponse(frozen["content"])
+    for header, value in frozen["headers"].items():
+        response[header] = value
+    return response
+
+
+async def _wait_for(key):
+    wait = getattr(settings, "PAGE_CACHE_LOCK_WAIT", DEFAULT_LOCK_WAIT)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        frozen = await cache.aget(key)
+        if frozen is not None:
+            return frozen
+    return None
+
+
+async def aget_or_render(name, version, render):
+    """Страница name версии version из кэша или из await render().
+
+    Кэшируются только ответы 200; тело и STORED_HEADERS одинаковы для всех
+    посетителей, поэтому render не должен зависеть от пользователя.
+    """
+    key = _key(name, version)
+    frozen = await cache.aget(key)
+    metrics.record_cache(f"page_{name}", frozen is not None)
+    if frozen is not None:
+        return _thaw(frozen)
+
+    lock = f"{key}:lock"
+    if not await cache.aadd(lock, 1, LOCK_TIMEOUT):
+        frozen = await _wait_for(key)
+        if frozen is not None:
+            return _thaw(frozen)
+        # Рендер-владелец не успел: страница нужна сейчас
+        return await render()
+
+    try:
+        response = await render()
+        if response.status_code == 200:
+            timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+            await cache.aset(key, _freeze(response), timeout)
+        return response
+    finally:
+        await cache.adelete(lock)
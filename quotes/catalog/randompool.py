@@ -0,0 +1,163 @@
+"""Пул заранее отрендеренных анонимных страниц случайной цитаты.
+
+Страницу случайной цитаты нельзя закэшировать целиком, но анонимные
+посетители видят одно и то же, кроме самой цитаты и фона. Пул держит в кэше
+RANDOM_PAGE_POOL_SIZE готовых вариантов и отдаёт случайный из них без
+выборки, запросов и рендера. Каждый вариант — цитата из взвешенной выборки,
+поэтому доля показов цитаты по-прежнему пропорциональна весу. Вариант старше
+RANDOM_PAGE_POOL_TTL ещё отдаётся, но после ответа перерисовывается заново
+(request_finished, как сброс просмотров). Просмотр записывается цитате,
+которую получил посетитель.
+
+Размер 0 выключает пул.
+"""
+
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from . import metrics, viewcounts
+
+DEFAULT_SIZE = 0
+DEFAULT_TTL = 30
+# Вариант хранится дольше TTL: устаревший отдаётся, пока рисуется новый
+STALE_FACTOR = 10
+LOCK_TIMEOUT = 10
+# Сколько вариантов перерисовать после одного ответа
+REFRESH_PER_REQUEST = 1
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def _key(slot):
+    return f"catalog:random_pool:{slot}"
+
+
+def _anonymous_request():
+    """Запрос, от имени которого рендерится вариант: анонимный, без сессии"""
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = reverse("random_quote_view")
+    request.META = {"SERVER_NAME": "localhost", "SERVER_PORT": "80"}
+    request.user = AnonymousUser()
+    return request
+
+
+def render_variant():
+    """Вариант страницы: {"content", "link", "quote_id", "rendered_at"}"""
+    from .forms import QuoteForm
+    from .views import get_random_background_image, get_random_quote
+
+    quote = get_random_quote()
+    background = get_random_background_image()
+    content = render_to_string(
+        "myapp/quote.html",
+        {"quote": quote, "background": background, "form": QuoteForm()},
+        request=_anonymous_request(),
+    )
+    return {
+        "content": content.encode(),
+        "link": background.link_header() if background is not None else None,
+        "quote_id": quote.pk if quote is not None else None,
+        "rendered_at": time.time(),
+    }
+
+
+class RandomPagePool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._due = set()
+
+    def size(self):
+        return getattr(settings, "RANDOM_PAGE_POOL_SIZE", DEFAULT_SIZE)
+
+    def ttl(self):
+        return getattr(settings, "RANDOM_PAGE_POOL_TTL", DEFAULT_TTL)
+
+    async def aserves(self, request):
+        """Пул подходит: анонимный GET без ожидающих сообщений"""
+        if (
+            not self.size()
+            or request.method not in SAFE_METHODS
+            or CookieStorage.cookie_name in request.COOKIES
+        ):
+            return False
+        # Без cookie сессии пользователь определяется без запросов к базе
+        user = await request.auser()
+        return not user.is_authenticated
+
+    def refresh(self, slot):
+        variant = render_variant()
+        cache.set(_key(slot), variant, self.ttl() * STALE_FACTOR)
+        return variant
+
+    def _serve(self, slot, variant):
+        if time.time() - variant["rendered_at"] >= self.ttl():
+            with self._lock:
+                self._due.add(slot)
+        if variant["quote_id"] is not None:
+            viewcounts.record_view(variant["quote_id"])
+        response = HttpResponse(variant["content"])
+        if variant["link"]:
+            response["Link"] = variant["link"]
+        return response
+
+    async def aserve(self):
+        slot = random.randrange(self.size())
+        variant = await cache.aget(_key(slot))
+        metrics.record_cache("random_pool", variant is not None)
+        if variant is None:
+            # Пустой слот рисуется сразу: первый запрос после старта
+            variant = await sync_to_async(self.refresh)(slot)
+        return self._serve(slot, variant)
+
+    def refresh_due(self, limit=REFRESH_PER_REQUEST):
+        """Перерисовывает устаревшие варианты; вызывается после ответа"""
+        refreshed = 0
+        while refreshed < limit:
+            with self._lock:
+                if not self._due:
+                    return refreshed
+                slot = self._due.pop()
+            lock = f"{_key(slot)}:lock"
+            # Тот же слот мог уже взять другой воркер
+            if not cache.add(lock, 1, LOCK_TIMEOUT):
+                continue
+            try:
+                self.refresh(slot)
+            finally:
+                cache.delete(lock)
+            refreshed += 1
+        return refreshed
+
+    def clear(self):
+        with self._lock:
+            self._due.clear()
+        cache.delete_many([_key(slot) for slot in range(self.size())])
+
+
+pool = RandomPagePool()
+
+
+async def aserves(request):
+    return await pool.aserves(request)
+
+
+async def aserve():
+    return await pool.aserve()
+
+
+def refresh_due():
+    return pool.refresh_due()
+
+
+def clear():
+    pool.clear()
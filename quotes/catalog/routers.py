@@ -0,0 +1,64 @@
+"""Маршрутизация чтений на реплику для горячих страниц.
+
+Чтения уходят на READ_REPLICA_ALIAS только внутри replica_reads(): выборка
+случайной цитаты, топ и список цитат в админке. Всё остальное, включая
+записи, идёт в default. Пользователь, который только что голосовал или
+добавлял цитату, READ_REPLICA_PIN_SECONDS читает с основной базы, чтобы
+видеть свои изменения, пока реплика не догнала.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_COOKIE = "primary_pin"
+DEFAULT_PIN_SECONDS = 5
+
+_replica_reads = ContextVar("catalog_replica_reads", default=False)
+_pinned = ContextVar("catalog_primary_pinned", default=False)
+
+
+def replica_alias():
+    return getattr(settings, "READ_REPLICA_ALIAS", None)
+
+
+@contextmanager
+def replica_reads():
+    """Разрешает чтение с реплики для запросов внутри блока"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _replica_reads.get() and not _pinned.get():
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default, объекты из обеих баз совместимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = replica_alias()
+        if alias and db == alias:
+            # Схема приходит на реплику вместе с данными через sync_replica
+            return False
+        return None
@@ -0,0 +1,112 @@
+import bisect
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .models import Quote
+
+# Сколько секунд таблица живёт без инвалидации. Сигналы приходят только
+# в процесс, который сделал запись, поэтому соседние воркеры узнают об
+# изменениях весов не позже этого срока.
+DEFAULT_MAX_AGE = 60
+
+
+class WeightedSampler:
+    """Взвешенный выбор id по массиву префиксных сумм: O(log n) на выборку"""
+
+    def __init__(self, items, version=0):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.ids = []
+        self.cumulative = []
+        total = 0
+        for pk, weight in items:
+            if weight <= 0:
+                continue
+            total += weight
+            self.ids.append(pk)
+            self.cumulative.append(total)
+        self.total = total
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pick(self):
+        """Возвращает id случайной цитаты пропорционально весу или None"""
+        if not self.total:
+            return None
+        point = random.uniform(0, self.total)
+        index = bisect.bisect_left(self.cumulative, point)
+        return self.ids[min(index, len(self.ids) - 1)]
+
+
+_lock = threading.Lock()
+_version = 0
+_sampler = None
+
+
+def invalidate():
+    """Помечает текущую таблицу устаревшей; перестройка произойдёт лениво"""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _is_fresh(sampler):
+    max_age = getattr(settings, "QUOTE_SAMPLER_MAX_AGE", DEFAULT_MAX_AGE)
+    return (
+        sampler is not None
+        and sampler.version == _version
+        and time.monotonic() - sampler.built_at < max_age
+    )
+
+
+def _active_weights():
+    return (
+        Quote.objects.filter(is_active=True).order_by("id").values_list("id", "weight")
+    )
+
+
+def _current():
+    """Актуальная таблица или None, если её нужно перестроить"""
+    sampler = _sampler
+    fresh = _is_fresh(sampler)
+    metrics.record_cache("sampler", fresh)
+    return sampler if fresh else None
+
+
+def _build_version():
+    with _lock:
+        return _version
+
+
+def _install(items, version):
+    global _sampler
+    sampler = WeightedSampler(items, version)
+    with _lock:
+        # Если пока мы читали строки пришла инвалидация, таблица уже
+        # помечена старой версией и будет перестроена при следующем вызове.
+        if _sampler is None or _sampler.version <= version:
+            _sampler = sampler
+    return sampler
+
+
+def get_sampler():
+    """Возвращает актуальный сэмплер, перестраивая его только при смене версии"""
+    sampler = _current()
+    if sampler is not None:
+        return sampler
+    version = _build_version()
+    return _install(_active_weights(), version)
+
+
+async def aget_sampler():
+    """Асинхронный get_sampler: актуальная таблица отдаётся без обращения к базе"""
+    sampler = _current()
+    if sampler is not None:
+        return sampler
+    version = _build_version()
+    return _install([row async for row in _active_weights()], version)
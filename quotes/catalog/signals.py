@@ -0,0 +1,134 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from . import (
+    backgrounds,
+    leaderboard,
+    randompool,
+    sampling,
+    timing,
+    trending,
+    viewcounts,
+)
+from .models import Quote, Source, soft_delete_changed
+
+# Поля, от которых зависит таблица взвешенного выбора
+SAMPLER_FIELDS = {"weight", "is_active"}
+# Поля, от которых зависит топ по лайкам
+LEADERBOARD_FIELDS = {"likes", "is_active"}
+# PRAGMA, которые можно задать в SQLITE_PRAGMAS: имя и значение подставляются
+# в SQL строкой, поэтому принимаются только известные имена. Только настройки
+# соединения: journal_mode записывается в файл базы и задаётся командой
+# sqlite_journal_mode
+SQLITE_PRAGMA_NAMES = {
+    "busy_timeout",
+    "cache_size",
+    "foreign_keys",
+    "journal_size_limit",
+    "mmap_size",
+    "synchronous",
+    "temp_store",
+    "wal_autocheckpoint",
+}
+SQLITE_PRAGMA_KEYWORD = re.compile(r"[A-Za-z_]+")
+# Настройки, от которых зависят пути и URL фонов
+BACKGROUND_SETTINGS = {
+    "BACKGROUND_IMAGE_DIR",
+    "STATICFILES_DIRS",
+    "STATIC_ROOT",
+    "STATIC_URL",
+    "STORAGES",
+}
+
+
+@receiver(post_save, sender=Quote)
+def invalidate_sampler_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SAMPLER_FIELDS & set(update_fields):
+        return
+    sampling.invalidate()
+    # Готовые варианты выбраны по старым весам, среди них может быть и
+    # скрытая цитата
+    randompool.clear()
+
+
+@receiver(post_save, sender=Quote)
+def invalidate_leaderboard_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not LEADERBOARD_FIELDS & set(update_fields):
+        return
+    leaderboard.invalidate()
+
+
+@receiver(post_delete, sender=Quote)
+def invalidate_on_delete(sender, instance, **kwargs):
+    sampling.invalidate()
+    leaderboard.invalidate()
+    randompool.clear()
+
+
+@receiver(post_delete, sender=Quote)
+def release_source_slot_on_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        Source.release_quote_slots(instance.source_id)
+
+
+@receiver(soft_delete_changed, sender=Quote)
+def invalidate_on_soft_delete(sender, **kwargs):
+    sampling.invalidate()
+    leaderboard.invalidate()
+    randompool.clear()
+
+
+@receiver(request_finished)
+def flush_view_counts(sender, **kwargs):
+    # Срабатывает после отправки ответа, поэтому страница не ждёт записи
+    viewcounts.flush_if_due()
+
+
+@receiver(request_finished)
+def flush_trending_activity(sender, **kwargs):
+    # После сброса просмотров: их пачка уже в буфере трендов
+    trending.flush_if_due()
+
+
+@receiver(request_finished)
+def refresh_random_pool(sender, **kwargs):
+    # Устаревший вариант уже отдан; новый рисуется после ответа
+    randompool.refresh_due()
+
+
+@receiver(connection_created)
+def install_query_timing(sender, connection, **kwargs):
+    # Соединения свои у каждого потока, в том числе у потока sync_to_async,
+    # где выполняются запросы асинхронных представлений
+    timing.install(connection)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению с SQLite"""
+    if connection.vendor != "sqlite":
+        return
+    for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+        if name not in SQLITE_PRAGMA_NAMES:
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS: неизвестная PRAGMA {name!r}")
+        if not isinstance(value, int) and not (
+            isinstance(value, str) and SQLITE_PRAGMA_KEYWORD.fullmatch(value)
+        ):
+            raise ImproperlyConfigured(
+                f"SQLITE_PRAGMAS: значение {name} должно быть числом или словом"
+            )
+        # Напрямую через драйвер: PRAGMA не должны попадать в счётчики запросов
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(setting_changed)
+def reset_backgrounds(sender, setting, **kwargs):
+    if setting in BACKGROUND_SETTINGS:
+        backgrounds.reset()
@@ -0,0 +1,147 @@
+"""Отдача собранной статики в WSGI, до Django.
+
+При DEBUG = False static() в urls.py ничего не добавляет, и /static/ отвечал
+404. Слой один раз при старте обходит STATIC_ROOT и запоминает для каждого
+файла путь, размер, тип и копию .gz от collectstatic. Файлы с хэшем
+содержимого в имени (значения staticfiles.json) браузер кэширует на год с
+immutable, остальные — на STATIC_MAX_AGE секунд с проверкой по ETag.
+"""
+
+import json
+import mimetypes
+from pathlib import Path
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.utils.http import http_date
+
+from .storage import gzip_name
+
+FOREVER = 365 * 24 * 60 * 60
+DEFAULT_MAX_AGE = 60
+BLOCK_SIZE = 64 * 1024
+TEXT_TYPES = ("application/javascript", "application/json", "image/svg+xml")
+
+
+class StaticFile:
+    """Файл STATIC_ROOT и готовые заголовки ответа для него"""
+
+    def __init__(self, path, cache_control):
+        stat = path.stat()
+        self.path = path
+        self.size = stat.st_size
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in TEXT_TYPES:
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.etag = f'"{int(stat.st_mtime):x}-{self.size:x}"'
+        self.headers = [
+            ("Cache-Control", cache_control),
+            ("Last-Modified", http_date(stat.st_mtime)),
+        ]
+        gz_path = path.with_name(gzip_name(path.name))
+        self.gz_path = gz_path if gz_path.is_file() else None
+        if self.gz_path:
+            self.gz_size = gz_path.stat().st_size
+            self.headers.append(("Vary", "Accept-Encoding"))
+
+
+def _accepts_gzip(environ):
+    for coding in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        key, _, value = params.strip().partition("=")
+        if key.strip() != "q":
+            return True
+        try:
+            return float(value) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def _etag_matches(environ, etag):
+    header = environ.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class StaticFilesLayer:
+    """WSGI-обёртка: отдаёт файлы STATIC_ROOT, остальное передаёт приложению"""
+
+    def __init__(self, application, root=None, prefix=None, max_age=None):
+        self.application = application
+        self.root = Path(root or settings.STATIC_ROOT)
+        self.prefix = "/" + (prefix or settings.STATIC_URL).strip("/") + "/"
+        if max_age is None:
+            max_age = getattr(settings, "STATIC_MAX_AGE", DEFAULT_MAX_AGE)
+        self.max_age = max_age
+        self.files = self.scan()
+
+    def immutable_names(self):
+        """Имена с хэшем содержимого из манифеста collectstatic"""
+        try:
+            manifest = json.loads((self.root / "staticfiles.json").read_text("utf-8"))
+        except (OSError, ValueError):
+            return set()
+        return set(manifest.get("paths", {}).values())
+
+    def scan(self):
+        if not self.root.is_dir():
+            return {}
+        immutable = self.immutable_names()
+        files = {}
+        for path in self.root.rglob("*"):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.root).as_posix()
+            if name.endswith(".gz") and path.with_suffix("").is_file():
+                continue
+            if name in immutable:
+                cache_control = f"public, max-age={FOREVER}, immutable"
+            else:
+                cache_control = f"public, max-age={self.max_age}"
+            files[self.prefix + name] = StaticFile(path, cache_control)
+        return files
+
+    def find(self, environ):
+        path = environ.get("PATH_INFO", "")
+        if not path.startswith(self.prefix):
+            return None
+        # PATH_INFO в WSGI — байты UTF-8, прочитанные как latin-1
+        path = path.encode("latin-1").decode("utf-8", "replace")
+        return self.files.get(path)
+
+    def __call__(self, environ, start_response):
+        static = self.find(environ)
+        if static is None:
+            return self.application(environ, start_response)
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            start_response(
+                "405 Method Not Allowed",
+                [("Allow", "GET, HEAD"), ("Content-Length", "0")],
+            )
+            return []
+
+        use_gzip = static.gz_path is not None and _accepts_gzip(environ)
+        etag = static.etag[:-1] + '-gz"' if use_gzip else static.etag
+        headers = [*static.headers, ("ETag", etag)]
+        if _etag_matches(environ, etag):
+            start_response("304 Not Modified", headers)
+            return []
+
+        headers.append(("Content-Type", static.content_type))
+        if use_gzip:
+            path, size = static.gz_path, static.gz_size
+            headers.append(("Content-Encoding", "gzip"))
+        else:
+            path, size = static.path, static.size
+        headers.append(("Content-Length", str(size)))
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        return file_wrapper(open(path, "rb"), BLOCK_SIZE)
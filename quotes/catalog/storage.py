@@ -0,0 +1,59 @@
+"""Хранилище статики для collectstatic: имена с хэшем содержимого и копии .gz.
+
+ManifestStaticFilesStorage переименовывает файлы в name.<md5>.ext, переписывает
+ссылки в CSS и сохраняет соответствие имён в staticfiles.json. Здесь после
+этого рядом с каждым файлом кладётся сжатая копия .gz, если сжатие даёт
+заметный выигрыш: StaticFilesLayer отдаёт её без сжатия на каждый запрос.
+"""
+
+import gzip
+from urllib.parse import unquote, urlsplit
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+# Копия .gz сохраняется, только если она меньше оригинала хотя бы на 5%:
+# JPEG и PNG уже сжаты и почти всегда остаются без копии
+GZIP_MAX_RATIO = 0.95
+
+
+def gzip_name(name):
+    return f"{name}.gz"
+
+
+class HashedGzipStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # Без записи в манифесте родитель хэшировал бы файл из STATIC_ROOT и
+        # ссылался на name.<md5>.ext, которого там нет. Файл, не прошедший
+        # collectstatic этим хранилищем, отдаётся под своим именем.
+        path = unquote(urlsplit(name).path).strip()
+        if self.hash_key(path) not in self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Сжимаются окончательные имена: промежуточные проходы по CSS
+        # могут выдавать хэши, которые потом меняются
+        for name in set(paths) | set(self.hashed_files.values()):
+            self.compress(name)
+
+    def compress(self, name):
+        """Сохраняет name.gz рядом с файлом; True, если копия записана"""
+        if name.endswith(".gz") or not self.exists(name):
+            return False
+        with self.open(name) as original:
+            content = original.read()
+        # mtime=0: одинаковое содержимое даёт одинаковый .gz при каждой сборке
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        target = gzip_name(name)
+        if self.exists(target):
+            self.delete(target)
+        if len(compressed) > len(content) * GZIP_MAX_RATIO:
+            return False
+        self._save(target, ContentFile(compressed))
+        return True
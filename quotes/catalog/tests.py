@@ -1,19 +1,103 @@
+import asyncio
+import csv
+import gzip
+import io
 import json
+import os
+import random
+import re
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Barrier, Thread
 from unittest.mock import patch
+from wsgiref.util import setup_testing_defaults
 
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
 from django.forms import ValidationError
-from django.test import Client, TestCase
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
+from django.utils import timezone
+
+from . import (
+    backgrounds,
+    counters,
+    leaderboard,
+    pagecache,
+    randompool,
+    sampling,
+    trending,
+    viewcounts,
+    weights,
+)
+from .backgrounds import image_size
+from .counters import increment
 from .forms import QuoteForm
-from .models import Quote, Source, SourceType
+from .leaderboard import Leaderboard
+from .metrics import Counter, Histogram
+from .middleware import MetricsMiddleware, ReadReplicaMiddleware
+from .models import (
+    Quote,
+    QuoteActivity,
+    QuoteArchive,
+    Source,
+    SourceArchive,
+    SourceType,
+    TrendingScore,
+    text_digest,
+)
+from .routers import PIN_COOKIE, ReadReplicaRouter, pinned_to_primary, replica_reads
+from .sampling import WeightedSampler
+from .signals import configure_sqlite
+from .static_layer import StaticFilesLayer
+from .viewcounts import ViewCountBuffer
+from .views import get_random_quote
+from .weights import set_weights
+
+# Сессия, пользователь, цитата и типы источников; сессия не перезаписывается
+QUERIES_AUTHENTICATED_PAGE = 4
+
+
+def reset_process_state():
+    """Сбрасывает буферы, кэши и таблицы процесса, переживающие откат теста"""
+    viewcounts.buffer.clear()
+    trending.buffer.clear()
+    cache.clear()
+    sampling.invalidate()
+    leaderboard.invalidate()
+    trending.invalidate()
+    randompool.clear()
 
 
 class BaseTestSetup(TestCase):
     """Базовый класс для настройки тестовых данных"""
 
     def setUp(self):
+        reset_process_state()
+        self.addCleanup(reset_process_state)
+
         self.user = User.objects.create_user(
             username="testuser", password="testpass123"
         )
@@ -130,7 +214,7 @@ class ViewTests(BaseTestSetup):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "myapp/quote.html")
         self.assertIn("quote", response.context)
-        self.assertIn("bg_path", response.context)
+        self.assertIn("background", response.context)
 
         # Более надежная проверка содержимого
         self.assertContains(response, "blockquote")  # Проверяем наличие тега с цитатой
@@ -143,7 +227,7 @@ class ViewTests(BaseTestSetup):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "myapp/top_quotes.html")
         self.assertIn("top_quotes", response.context)
-        self.assertIn("bg_path", response.context)
+        self.assertIn("background", response.context)
 
     def test_add_quote_view_requires_login(self):
         """Тест что добавление цитаты требует авторизации"""
@@ -232,12 +316,9 @@ class FormTests(BaseTestSetup):
         Quote.objects.create(
             text="Вторая цитата из Крестного отца", source=self.movie_source, weight=5
         )
-        quote = Quote(
-            text="Третья цитата из Крестного отца", source=self.movie_source, weight=5
-        )
-        # Отключаем full_clean для этого объекта
-        quote.full_clean = lambda: None
-        quote.save(force_insert=True)  # Теперь не будет ValidationError
+        # Вместе с цитатами из setUp у источника теперь 3 активные цитаты.
+        # Обойти лимит через отключённый full_clean больше нельзя: место под
+        # цитату занимается условным UPDATE счётчика источника.
 
         # Пытаемся добавить четвертую через форму
         form_data = {
@@ -252,20 +333,122 @@ class FormTests(BaseTestSetup):
         self.assertIn("__all__", form.errors)
 
 
+class SourceCounterTests(BaseTestSetup):
+    """Тесты счётчика активных цитат у источника"""
+
+    def count(self, source):
+        source.refresh_from_db()
+        return source.active_quote_count
+
+    def test_counter_follows_create_delete_restore(self):
+        """Тест счётчика при создании, мягком удалении и восстановлении"""
+        self.assertEqual(self.count(self.movie_source), 2)
+
+        self.quote1.delete()
+        self.assertEqual(self.count(self.movie_source), 1)
+
+        self.quote1.is_active = True
+        self.quote1.save()
+        self.assertEqual(self.count(self.movie_source), 2)
+
+    def test_counter_follows_queryset_delete_and_restore(self):
+        """Тест счётчика при массовом мягком удалении и восстановлении"""
+        Quote.objects.filter(source=self.movie_source).delete()
+        self.assertEqual(self.count(self.movie_source), 0)
+        self.assertEqual(self.count(self.book_source), 1)
+
+        Quote.all_objects.filter(source=self.movie_source).restore()
+        self.assertEqual(self.count(self.movie_source), 2)
+
+    def test_restore_over_limit_is_rejected(self):
+        """Тест что восстановление сверх лимита откатывается целиком"""
+        self.quote1.delete()
+        Quote.objects.create(text="Третья", source=self.movie_source)
+        Quote.objects.create(text="Четвёртая", source=self.movie_source)
+
+        with self.assertRaises(ValidationError):
+            Quote.all_objects.filter(pk=self.quote1.pk).restore()
+        self.quote1.refresh_from_db()
+        self.assertFalse(self.quote1.is_active)
+        self.assertEqual(self.count(self.movie_source), 3)
+
+    def test_moving_quote_between_sources(self):
+        """Тест переноса цитаты в другой источник"""
+        self.quote1.source = self.book_source
+        self.quote1.save()
+        self.assertEqual(self.count(self.movie_source), 1)
+        self.assertEqual(self.count(self.book_source), 2)
+
+    def test_bypassing_full_clean_does_not_bypass_limit(self):
+        """Тест что лимит держится без full_clean (гонка двух вставок)"""
+        Quote.objects.create(text="Третья", source=self.movie_source)
+        quote = Quote(text="Четвёртая", source=self.movie_source)
+        quote.full_clean = lambda: None
+
+        with self.assertRaises(ValidationError):
+            quote.save()
+        self.assertEqual(self.count(self.movie_source), 3)
+        self.assertFalse(Quote.all_objects.filter(text="Четвёртая").exists())
+
+    def test_hard_delete_releases_slot(self):
+        """Тест что физическое удаление освобождает место"""
+        Quote.objects.filter(pk=self.quote1.pk).hard_delete()
+        self.assertEqual(self.count(self.movie_source), 1)
+
+    def test_recount_command(self):
+        """Тест команды пересчёта счётчиков"""
+        Source.all_objects.update(active_quote_count=0)
+        call_command("recount_active_quotes", stdout=io.StringIO())
+        self.assertEqual(self.count(self.movie_source), 2)
+        self.assertEqual(self.count(self.book_source), 1)
+
+
+class TextHashTests(BaseTestSetup):
+    """Тесты хэша нормализованного текста"""
+
+    def test_hash_populated_on_save(self):
+        """Тест что хэш заполняется при сохранении"""
+        self.assertEqual(self.quote1.text_hash, text_digest(self.quote1.text))
+
+    def test_reformatted_duplicate_rejected_by_form(self):
+        """Тест что дубликат с другим регистром и пробелами отклоняется"""
+        form = QuoteForm(
+            data={
+                "text": "  предложение,   ОТ КОТОРОГО\nнельзя отказаться. ",
+                "source_name": "Другой источник",
+                "source_type": self.book_type.id,
+                "weight": 1,
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("text", form.errors)
+
+    def test_reformatted_duplicate_rejected_by_model(self):
+        """Тест что уникальность проверяется по хэшу и на уровне модели"""
+        duplicate = Quote(
+            text=self.quote3.text.upper(), source=self.movie_source, weight=1
+        )
+        with self.assertRaises(ValidationError):
+            duplicate.save()
+
+    def test_backfill_command(self):
+        """Тест команды заполнения хэшей"""
+        Quote.all_objects.update(text_hash=None)
+        call_command("backfill_text_hash", stdout=io.StringIO())
+
+        self.assertFalse(Quote.all_objects.filter(text_hash__isnull=True).exists())
+
+
 class WeightedSelectionTest(BaseTestSetup):
     """Тесты взвешенного выбора случайной цитаты"""
 
     def test_get_random_quote_returns_quote(self):
         """Тест что функция возвращает цитату"""
-        from .views import get_random_quote  # Импортируем из views
-
         quote = get_random_quote()
         self.assertIsInstance(quote, Quote)
 
     def test_get_random_quote_no_quotes(self):
         """Тест поведения при отсутствии цитат"""
-        from .views import get_random_quote
-
         # Удаляем все цитаты
         Quote.objects.all().delete()
         quote = get_random_quote()
@@ -273,8 +456,6 @@ class WeightedSelectionTest(BaseTestSetup):
 
     def test_weight_influence_on_selection(self):
         """Тест влияния веса на вероятность выбора"""
-        from .views import get_random_quote
-
         # Создаем цитаты с разными весами
         high_weight_quote = Quote.objects.create(
             text="Цитата с высоким весом",
@@ -299,6 +480,1368 @@ class WeightedSelectionTest(BaseTestSetup):
             self.assertEqual(selected_quote, high_weight_quote)
 
 
+class WeightedSamplerTests(BaseTestSetup):
+    """Тесты in-memory сэмплера по префиксным суммам"""
+
+    def test_empirical_distribution_matches_weight(self):
+        """Тест что частоты выборки соответствуют весам"""
+        weights = {"a": 1, "b": 3, "c": 6, "d": 0}
+        sampler = WeightedSampler(weights.items())
+        random.seed(1234)
+        draws = 60000
+        counts = {key: 0 for key in weights}
+        for _ in range(draws):
+            counts[sampler.pick()] += 1
+
+        total = sum(weights.values())
+        for key, weight in weights.items():
+            self.assertAlmostEqual(counts[key] / draws, weight / total, delta=0.01)
+
+    def test_draw_does_not_query_selection_tables(self):
+        """Тест что после прогрева выборка делает только запрос самой цитаты"""
+        get_random_quote()
+        with self.assertNumQueries(1):
+            quote = get_random_quote()
+        self.assertIsInstance(quote, Quote)
+
+    def test_weight_change_rebuilds_table(self):
+        """Тест что изменение веса инвалидирует таблицу"""
+        old = sampling.get_sampler()
+        self.quote1.weight = 50
+        self.quote1.save()
+        new = sampling.get_sampler()
+
+        self.assertGreater(new.version, old.version)
+        self.assertEqual(new.total, 50 + 5 + 8)
+
+    def test_views_update_keeps_table(self):
+        """Тест что обновление просмотров не перестраивает таблицу"""
+        old = sampling.get_sampler()
+        self.quote1.views += 1
+        self.quote1.save(update_fields=["views"])
+        self.assertIs(sampling.get_sampler(), old)
+
+    def test_soft_deleted_quote_is_never_picked(self):
+        """Тест что мягко удалённая цитата исключается из выборки"""
+        self.quote2.delete()
+        self.quote3.delete()
+        sampler = sampling.get_sampler()
+        self.assertEqual(sampler.ids, [self.quote1.pk])
+
+
+class CounterTests(BaseTestSetup):
+    """Тесты атомарных счётчиков"""
+
+    def test_increment_returns_fresh_value(self):
+        """Тест что инкремент возвращает значение из базы, а не из объекта"""
+        Quote.objects.filter(pk=self.quote1.pk).update(likes=41)
+        self.assertEqual(increment(self.quote1.pk, "likes"), 42)
+
+    def test_increment_skips_full_clean(self):
+        """Тест что инкремент не запускает валидацию модели"""
+        with patch.object(Quote, "full_clean") as mock_clean:
+            with self.assertNumQueries(1):
+                increment(self.quote1.pk, "views")
+        mock_clean.assert_not_called()
+
+    def test_increment_inactive_quote(self):
+        """Тест что счётчик мягко удалённой цитаты не меняется"""
+        self.quote1.delete()
+        self.assertIsNone(increment(self.quote1.pk, "likes"))
+
+    def test_like_unknown_quote_returns_404(self):
+        """Тест лайка несуществующей цитаты"""
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.post(reverse("like_quote", args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConcurrentCounterTests(TransactionTestCase):
+    """Тесты счётчиков под параллельной нагрузкой"""
+
+    def setUp(self):
+        source_type = SourceType.objects.create(name="Фильм")
+        source = Source.objects.create(name="Крестный отец", source_type=source_type)
+        self.quote = Quote.objects.create(text="Параллельная цитата", source=source)
+
+    def test_parallel_votes_are_not_lost(self):
+        """Тест что параллельные голоса не теряются"""
+        workers, votes_per_worker = 8, 25
+        barrier = Barrier(workers)
+
+        def increment_with_retry(attempts=1000):
+            # Тестовая SQLite в памяти с shared cache отвечает "table is locked"
+            # вместо ожидания блокировки: такой голос не засчитан, повторяем.
+            # Другие ошибки и бесконечная блокировка роняют тест, а не вешают.
+            for attempt in range(attempts):
+                try:
+                    return increment(self.quote.pk, "likes")
+                except OperationalError as error:
+                    if "locked" not in str(error) or attempt == attempts - 1:
+                        raise
+
+        def vote():
+            barrier.wait()
+            try:
+                return [increment_with_retry() for _ in range(votes_per_worker)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(vote) for _ in range(workers)]
+            results = [value for future in futures for value in future.result()]
+
+        total = workers * votes_per_worker
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.likes, total)
+        # Каждый голос увидел своё уникальное значение счётчика
+        self.assertEqual(sorted(results), list(range(1, total + 1)))
+
+    def test_lock_error_is_retried(self):
+        """Тест повтора записи счётчика при «database is locked»"""
+        side_effect = [OperationalError("database is locked"), 5]
+        with patch.object(counters, "_increment_once", side_effect=side_effect):
+            with patch.object(counters.time, "sleep") as sleep:
+                self.assertEqual(counters.increment(self.quote.pk, "likes"), 5)
+        sleep.assert_called_once()
+
+    def test_no_retry_inside_transaction(self):
+        """Тест: внутри внешней транзакции ошибка блокировки пробрасывается"""
+        error = OperationalError("database is locked")
+        with patch.object(counters, "_increment_once", side_effect=error) as once:
+            with self.assertRaises(OperationalError), transaction.atomic():
+                counters.increment(self.quote.pk, "likes")
+        self.assertEqual(once.call_count, 1)
+
+    def test_sqlite_pragmas_applied(self):
+        """Тест настроек соединения SQLite из SQLITE_PRAGMAS"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_sqlite_pragmas_validated(self):
+        """Тест: имя и значение PRAGMA не подставляются в SQL без проверки"""
+        for pragmas in (
+            {"synchronous": "NORMAL; DROP TABLE catalog_quote"},
+            {"key": "secret"},
+            {"journal_mode": "WAL"},
+            {"cache_size": 1.5},
+        ):
+            with self.subTest(pragmas=pragmas), override_settings(
+                SQLITE_PRAGMAS=pragmas
+            ):
+                with self.assertRaises(ImproperlyConfigured):
+                    configure_sqlite(sender=None, connection=connection)
+        self.assertTrue(Quote.objects.filter(pk=self.quote.pk).exists())
+
+    def test_journal_mode_not_switched_per_connection(self):
+        """Тест: режим журнала меняет только команда, а не каждое соединение"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertNotEqual(cursor.fetchone()[0].upper(), "WAL")
+        # Тестовая база в памяти не может перейти в WAL: команда сообщает об этом
+        with self.assertRaisesMessage(CommandError, "memory"):
+            call_command("sqlite_journal_mode", "WAL", stdout=io.StringIO())
+
+
+class ViewCountBufferTests(BaseTestSetup):
+    """Тесты отложенной записи просмотров"""
+
+    def test_random_quote_view_does_not_write_views(self):
+        """Тест что показ цитаты не обновляет счётчик синхронно"""
+        with patch.object(viewcounts.ViewCountBuffer, "is_due", return_value=False):
+            self.client.get(reverse("random_quote_view"))
+
+        self.assertEqual(sum(viewcounts.buffer.pending().values()), 1)
+        self.assertEqual(sum(Quote.objects.values_list("views", flat=True)), 0)
+
+    def test_flush_applies_pending_views(self):
+        """Тест что сброс буфера записывает все накопленные просмотры"""
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=1000)
+        for _ in range(3):
+            buffer.add(self.quote1.pk)
+        buffer.add(self.quote2.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 4)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+        self.quote1.refresh_from_db()
+        self.quote2.refresh_from_db()
+        self.assertEqual((self.quote1.views, self.quote2.views), (3, 1))
+        self.assertEqual(buffer.pending(), {})
+
+    def test_threshold_makes_buffer_due(self):
+        """Тест сброса по числу просмотров"""
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=2)
+        buffer.add(self.quote1.pk)
+        self.assertFalse(buffer.is_due())
+        buffer.add(self.quote1.pk)
+        self.assertTrue(buffer.is_due())
+
+    def test_views_flushed_after_response(self):
+        """Тест что буфер сбрасывается по окончании запроса, когда подошёл срок"""
+        with self.settings(VIEW_COUNT_FLUSH_THRESHOLD=1):
+            self.client.get(reverse("random_quote_view"))
+
+        self.assertEqual(sum(Quote.objects.values_list("views", flat=True)), 1)
+
+    def test_flush_command(self):
+        """Тест команды принудительного сброса"""
+        viewcounts.record_view(self.quote3.pk)
+        call_command("flush_view_counts", stdout=io.StringIO())
+
+        self.quote3.refresh_from_db()
+        self.assertEqual(self.quote3.views, 1)
+
+
+class LeaderboardTests(BaseTestSetup):
+    """Тесты инкрементального топа по лайкам"""
+
+    def setUp(self):
+        super().setUp()
+
+        Quote.objects.filter(pk=self.quote1.pk).update(likes=5)
+        Quote.objects.filter(pk=self.quote2.pk).update(likes=3)
+        self.board = Leaderboard(size=2)
+
+    def test_initial_ordering(self):
+        """Тест что топ упорядочен по убыванию лайков"""
+        self.assertEqual(self.board.ids(), [self.quote1.pk, self.quote2.pk])
+
+    def test_vote_below_top_is_ignored(self):
+        """Тест что голос, не меняющий топ, не трогает структуру"""
+        self.board.ids()
+        version = self.board.version
+        self.board.record_likes(self.quote3.pk, 1)
+        self.assertEqual(self.board.version, version)
+
+    def test_vote_into_top_reorders_without_queries(self):
+        """Тест что голос, попадающий в топ, обновляет порядок без запросов"""
+        self.board.ids()
+        self.board.record_likes(self.quote3.pk, 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.board.ids(), [self.quote3.pk, self.quote1.pk])
+
+    def test_like_view_updates_top_page(self):
+        """Тест что лайк через представление меняет страницу топа"""
+        leaderboard.invalidate()
+        self.client.login(username="testuser", password="testpass123")
+        for _ in range(6):
+            self.client.post(reverse("like_quote", args=[self.quote3.id]))
+
+        response = self.client.get(reverse("top_quotes"))
+        self.assertEqual(response.context["top_quotes"][0], self.quote3)
+
+    def test_soft_deleted_quote_leaves_top(self):
+        """Тест что мягко удалённая цитата пропадает из топа"""
+        leaderboard.top_quotes()
+        self.quote1.delete()
+        self.assertNotIn(self.quote1, leaderboard.top_quotes())
+
+
+class ImportQuotesTests(BaseTestSetup):
+    """Тесты потокового импорта цитат"""
+
+    def import_file(self, content, suffix, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"quotes{suffix}")
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(content)
+            call_command("import_quotes", path, *args, stdout=io.StringIO())
+
+    def test_import_csv_validates_in_batch(self):
+        """Тест импорта CSV с дубликатами и лимитом источника"""
+        content = (
+            "text,source,source_type,weight\n"
+            "Новая цитата,Крестный отец,Фильм,4\n"
+            "Ещё одна,Крестный отец,Фильм,1\n"
+            f"{self.quote3.text.upper()},Другая книга,Книга,1\n"
+            "Новая   ЦИТАТА,Новый источник,Повесть,1\n"
+            "Без источника,,Фильм,1\n"
+        )
+        self.import_file(content, ".csv", "--chunk-size", "2")
+
+        imported = Quote.objects.get(text="Новая цитата")
+        self.assertEqual(imported.weight, 4)
+        self.assertEqual(imported.source, self.movie_source)
+        self.assertFalse(Quote.objects.filter(text="Ещё одна").exists())
+        self.assertEqual(Quote.all_objects.count(), 4)
+        self.movie_source.refresh_from_db()
+        self.assertEqual(self.movie_source.active_quote_count, 3)
+        self.assertFalse(Source.objects.filter(name="Новый источник").exists())
+
+    def test_import_jsonl_creates_sources_and_types(self):
+        """Тест импорта JSONL с новыми источниками и типами"""
+        lines = [
+            {"text": f"Стих {i}", "source": "Сборник", "source_type": "Поэзия"}
+            for i in range(4)
+        ]
+        content = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines)
+        self.import_file(content, ".jsonl")
+
+        source = Source.objects.get(name="Сборник")
+        self.assertEqual(source.source_type.name, "Поэзия")
+        self.assertEqual(source.active_quote_count, 3)
+        self.assertEqual(Quote.objects.filter(source=source).count(), 3)
+
+    def test_import_jsonl_rejects_malformed_lines(self):
+        """Тест: неверный JSON и не-объекты уходят в отклонённые с номерами строк"""
+        content = "\n".join(
+            [
+                json.dumps({"text": "Первая", "source": "Сборник"}, ensure_ascii=False),
+                "",
+                '{"text": "оборвано',
+                '["не", "объект"]',
+                json.dumps({"text": "Вторая", "source": "Сборник"}, ensure_ascii=False),
+            ]
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            rejects = os.path.join(directory, "rejects.jsonl")
+            self.import_file(
+                content, ".jsonl", "--chunk-size", "1", "--rejects", rejects
+            )
+            with open(rejects, encoding="utf-8") as handle:
+                records = [json.loads(line) for line in handle]
+
+        self.assertEqual(
+            [(record["line"], record["reason"]) for record in records],
+            [(3, "неверный JSON"), (4, "строка не объект JSON")],
+        )
+        self.assertEqual(records[0]["row"], '{"text": "оборвано')
+        self.assertEqual(
+            set(
+                Quote.objects.filter(source__name="Сборник").values_list(
+                    "text", flat=True
+                )
+            ),
+            {"Первая", "Вторая"},
+        )
+
+    def test_import_reuses_inactive_source_type(self):
+        """Тест: скрытый вид источника с тем же именем не ломает импорт"""
+        self.book_type.delete()
+        content = "text,source,source_type,weight\nНовая,Другая книга,Книга,1\n"
+        self.import_file(content, ".csv")
+
+        source = Source.objects.get(name="Другая книга")
+        self.assertEqual(source.source_type_id, self.book_type.pk)
+
+
+class ExportQuotesTests(BaseTestSetup):
+    """Тесты потоковой выгрузки каталога"""
+
+    def test_export_requires_staff(self):
+        """Тест что выгрузка доступна только персоналу"""
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.get(reverse("export_quotes"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_csv_streams_catalog(self):
+        """Тест потоковой выгрузки CSV для персонала"""
+        self.user.is_staff = True
+        self.user.save()
+        self.quote2.delete()
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(reverse("export_quotes"))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        rows = list(csv.DictReader(content.splitlines()))
+
+        self.assertEqual(len(rows), 2)
+        row = next(row for row in rows if row["text"] == self.quote3.text)
+        self.assertEqual(row["source"], "Мастер и Маргарита")
+        self.assertEqual(row["source_type"], "Книга")
+        self.assertEqual(row["weight"], "8")
+
+    def test_export_command_round_trips_through_import(self):
+        """Тест что выгрузка команды читается import_quotes"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "quotes.jsonl")
+            call_command("export_quotes", "--format", "jsonl", "--output", path)
+            Quote.objects.filter(pk=self.quote3.pk).hard_delete()
+            call_command("import_quotes", path, stdout=io.StringIO())
+
+        restored = Quote.objects.get(text=self.quote3.text)
+        self.assertEqual(restored.source, self.book_source)
+        self.assertEqual(restored.weight, 8)
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=10**6)
+class QueryBudgetTests(BaseTestSetup):
+    """Тесты бюджета запросов страниц"""
+
+    def setUp(self):
+        super().setUp()
+
+        # Прогреваем in-memory структуры: их перестройка не входит в бюджет
+        sampling.get_sampler()
+        leaderboard.top_quotes()
+
+    def login(self):
+        # Вход через форму, как в жизни: сессия сохраняется с меткой продления
+        self.client.post(
+            reverse("login"), {"username": "testuser", "password": "testpass123"}
+        )
+
+    def test_random_quote_view_anonymous(self):
+        """Тест: цитата вместе с источником и его типом одним запросом"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("random_quote_view"))
+        quote = response.context["quote"]
+        self.assertContains(
+            response, f"<small>({quote.source.source_type.name})</small>"
+        )
+
+    def test_random_quote_view_authenticated(self):
+        """Тест: сессия, пользователь, цитата и типы источников без записи сессии"""
+        self.login()
+        with self.assertNumQueries(QUERIES_AUTHENTICATED_PAGE):
+            self.client.get(reverse("random_quote_view"))
+
+    def test_add_quote_get(self):
+        """Тест бюджета GET страницы добавления цитаты"""
+        self.login()
+        with self.assertNumQueries(QUERIES_AUTHENTICATED_PAGE):
+            self.client.get(reverse("add_quote"))
+
+    def test_top_quotes_view(self):
+        """Тест: топ читается одним запросом по первичным ключам"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("top_quotes"))
+        self.assertEqual(len(response.context["top_quotes"]), 3)
+
+
+class RequestTimingMiddlewareTests(BaseTestSetup):
+    """Тесты middleware замеров запросов"""
+
+    def test_disabled_by_default(self):
+        """Тест что без настройки заголовок не добавляется"""
+        response = self.client.get(reverse("random_quote_view"))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_TIMING_ENABLED=True, REQUEST_QUERY_BUDGET=10)
+    def test_server_timing_header(self):
+        """Тест заголовка Server-Timing с числом запросов и разделами"""
+        with self.assertLogs("catalog.timing", "INFO") as logs:
+            response = self.client.get(reverse("random_quote_view"))
+
+        header = response["Server-Timing"]
+        for metric in ("db;dur=", "render;dur=", "sampler;dur=", "total;dur="):
+            self.assertIn(metric, header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "random_quote_view")
+        self.assertGreaterEqual(record["queries"], 1)
+        self.assertIn(f'"{record["queries"]} queries"', header)
+        self.assertFalse(record["over_query_budget"])
+
+    @override_settings(REQUEST_TIMING_ENABLED=True, REQUEST_QUERY_BUDGET=0)
+    def test_over_budget_is_flagged(self):
+        """Тест что запрос сверх бюджета логируется как предупреждение"""
+        with self.assertLogs("catalog.timing", "WARNING") as logs:
+            self.client.get(reverse("top_quotes"))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record["over_query_budget"])
+
+    @override_settings(REQUEST_TIMING_ENABLED=True)
+    async def test_async_views_queries_counted(self):
+        """Тест: под ASGI считаются запросы из потока sync_to_async"""
+        with self.assertLogs("catalog.timing", "INFO") as logs:
+            response = await self.async_client.get(reverse("top_quotes"))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreaterEqual(record["queries"], 1)
+        self.assertIn(f'"{record["queries"]} queries"', response["Server-Timing"])
+        self.assertNotIn('"0 queries"', response["Server-Timing"])
+
+
+class MetricsTests(BaseTestSetup):
+    """Тесты метрик в формате Prometheus"""
+
+    def test_histogram_format(self):
+        """Тест текстового представления гистограммы"""
+        histogram = Histogram("test_seconds", "Тест", ["view"], buckets=(0.1, 1))
+        histogram.observe(0.05, "a")
+        histogram.observe(0.5, "a")
+        histogram.observe(5, "a")
+
+        lines = histogram.collect()
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{view="a"} 3', lines)
+
+    def test_shards_from_threads_are_summed(self):
+        """Тест что счётчики разных потоков складываются при сборе"""
+        counter = Counter("test_total", "Тест", ["kind"])
+        threads = [
+            Thread(target=lambda: [counter.inc("x") for _ in range(1000)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.values(), {("x",): 4000})
+
+    def test_shards_of_finished_threads_are_merged(self):
+        """Тест: шарды завершившихся потоков складываются в итог и удаляются"""
+        counter = Counter("test_total", "Тест", ["kind"])
+        histogram = Histogram("test_seconds", "Тест", buckets=(0.1, 1))
+
+        def work():
+            counter.inc("x")
+            histogram.observe(0.5)
+
+        for _ in range(20):
+            thread = Thread(target=work)
+            thread.start()
+            thread.join()
+        self.assertEqual(counter._shards, [])
+        self.assertEqual(histogram._shards, [])
+        counter.inc("x")
+        self.assertEqual(counter.values(), {("x",): 21})
+        self.assertEqual(histogram.values(), {(): [0, 20, 10.0, 20]})
+
+    @override_settings(DEBUG=True)
+    def test_metrics_endpoint(self):
+        """Тест что /metrics отдаёт задержки по именам URL и попадания в кэш"""
+        self.client.get(reverse("random_quote_view"))
+        self.client.get(reverse("top_quotes"))
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'catalog_request_duration_seconds_count{view="random_quote_view"}', body
+        )
+        self.assertIn('catalog_request_db_seconds_sum{view="top_quotes"}', body)
+        self.assertIn('catalog_cache_requests_total{cache="sampler",result=', body)
+        self.assertIn("catalog_view_buffer_pending ", body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        """Тест защиты /metrics токеном"""
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_closed_without_token_in_production(self):
+        """Тест: без токена /metrics закрыт при DEBUG=False"""
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+
+class AsyncViewTests(BaseTestSetup):
+    """Тесты асинхронных представлений и async-API сэмплера и топа"""
+
+    async def test_random_quote_view(self):
+        """Тест асинхронной страницы случайной цитаты через AsyncClient"""
+        response = await self.async_client.get(reverse("random_quote_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["quote"].views, 1)
+
+    async def test_like_and_dislike(self):
+        """Тест асинхронных лайка и дизлайка"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse("like_quote", args=[self.quote1.id])
+        )
+        self.assertEqual(response.json()["new_likes"], 1)
+        response = await self.async_client.post(
+            reverse("dislike_quote", args=[self.quote1.id])
+        )
+        self.assertEqual(response.json()["new_dislikes"], 1)
+
+    async def test_top_quotes_view(self):
+        """Тест асинхронной страницы топа"""
+        response = await self.async_client.get(reverse("top_quotes"))
+        self.assertEqual(
+            [quote.pk for quote in response.context["top_quotes"]],
+            [self.quote1.pk, self.quote2.pk, self.quote3.pk],
+        )
+
+    def test_fresh_sampler_without_queries(self):
+        """Тест: актуальная таблица отдаётся в async-коде без запросов к базе"""
+        sampler = sampling.get_sampler()
+        with self.assertNumQueries(0):
+            self.assertIs(async_to_sync(sampling.aget_sampler)(), sampler)
+
+    def test_middleware_is_async_capable(self):
+        """Тест: middleware не заставляет ASGI выполнять представления в потоке"""
+
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: None)))
+
+
+class ReadReplicaRouterTests(BaseTestSetup):
+    """Тесты маршрутизации чтений на реплику"""
+
+    def test_without_replica_everything_reads_default(self):
+        """Тест: без настроенной реплики маршрутизатор не вмешивается"""
+        with replica_reads():
+            self.assertIsNone(ReadReplicaRouter().db_for_read(Quote))
+
+    @override_settings(READ_REPLICA_ALIAS="replica")
+    def test_replica_reads_only_inside_block(self):
+        """Тест: реплика только внутри replica_reads и не для закреплённых"""
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Quote))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Quote), "replica")
+            with pinned_to_primary():
+                self.assertIsNone(router.db_for_read(Quote))
+        self.assertEqual(router.db_for_write(Quote), "default")
+        self.assertFalse(router.allow_migrate("replica", "catalog"))
+
+    @override_settings(READ_REPLICA_ALIAS="replica")
+    def test_vote_pins_user_to_primary(self):
+        """Тест: после голоса пользователь читает свои записи с default"""
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.post(reverse("like_quote", args=[self.quote1.id]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        middleware = ReadReplicaMiddleware(lambda request: None)
+        request = RequestFactory().get("/")
+        self.assertFalse(middleware.is_pinned(request))
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertTrue(middleware.is_pinned(request))
+
+    def test_sync_replica_requires_replica(self):
+        """Тест: sync_replica без настроенной реплики завершается ошибкой"""
+        with self.assertRaises(CommandError):
+            call_command("sync_replica", stdout=io.StringIO())
+
+
+class SlidingSessionTests(BaseTestSetup):
+    """Тесты записи сессий только при необходимости"""
+
+    def login(self):
+        return self.client.post(
+            reverse("login"), {"username": "testuser", "password": "testpass123"}
+        )
+
+    def test_anonymous_reader_gets_no_session(self):
+        """Тест: анонимный просмотр страниц цитат не создаёт сессию"""
+        for name in ("random_quote_view", "top_quotes"):
+            response = self.client.get(reverse(name))
+            self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_unchanged_session_is_not_saved(self):
+        """Тест: страница для вошедшего пользователя не перезаписывает сессию"""
+        self.assertIn(settings.SESSION_COOKIE_NAME, self.login().cookies)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("random_quote_view"))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(
+            [
+                q
+                for q in queries
+                if "django_session" in q["sql"] and "SELECT" not in q["sql"]
+            ]
+        )
+
+    def test_session_is_extended_after_interval(self):
+        """Тест: по истечении интервала сессия продлевается вместе с cookie"""
+        self.login()
+        with override_settings(SESSION_REFRESH_INTERVAL=0):
+            response = self.client.get(reverse("random_quote_view"))
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], settings.SESSION_COOKIE_AGE)
+
+
+class QuoteAdminChangelistTests(BaseTestSetup):
+    """Тесты списка цитат в админке"""
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.url = reverse("admin:catalog_quote_changelist")
+
+    def results(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {quote.pk for quote in response.context["cl"].result_list}
+
+    def test_sources_are_selected_with_quotes(self):
+        """Тест: источники читаются в том же запросе, что и цитаты"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith('SELECT "catalog_source"')]
+        )
+
+    def test_range_filter(self):
+        """Тест фильтра по диапазону лайков и кэша чисел в диапазонах"""
+        Quote.objects.filter(pk=self.quote1.pk).update(likes=15)
+        self.assertEqual(self.results(likes_range="10-100"), {self.quote1.pk})
+        self.assertEqual(
+            self.results(likes_range="0"), {self.quote2.pk, self.quote3.pk}
+        )
+
+    def test_search_uses_prefix_hash_and_id(self):
+        """Тест поиска по началу текста, источнику, точному тексту и id"""
+        self.assertEqual(self.results(q="Предложение, от"), {self.quote1.pk})
+        self.assertEqual(self.results(q="Крестный"), {self.quote1.pk, self.quote2.pk})
+        self.assertEqual(
+            self.results(
+                q="  НИКТО не может дать свободу, свободу можно только взять. "
+            ),
+            {self.quote3.pk},
+        )
+        self.assertEqual(self.results(q=str(self.quote2.pk)), {self.quote2.pk})
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_estimated_count_without_full_scan(self):
+        """Тест: для большого нефильтрованного списка COUNT(*) не выполняется"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries if "COUNT(*)" in q["sql"]])
+
+
+class BulkWeightTests(BaseTestSetup):
+    """Тесты массового изменения весов"""
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.url = reverse("admin:catalog_quote_changelist")
+
+    def weights(self):
+        return dict(Quote.all_objects.values_list("pk", "weight"))
+
+    def test_set_weights_single_update_and_invalidation(self):
+        """Тест: один bulk_update без перезаписи счётчиков и одна инвалидация"""
+        Quote.objects.filter(pk=self.quote1.pk).update(likes=7)
+        stale = self.weights()
+        with patch.object(sampling, "invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as queries:
+                    updated, missing = weights.set_weights(
+                        {self.quote1.pk: 50, str(self.quote2.pk): 5, uuid.uuid4(): 1}
+                    )
+        self.assertEqual((updated, len(missing)), (1, 1))
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("UPDATE")]), 1)
+        invalidate.assert_called_once()
+        self.assertEqual(self.weights()[self.quote1.pk], 50)
+        self.assertEqual(self.weights()[self.quote2.pk], stale[self.quote2.pk])
+        self.quote1.refresh_from_db()
+        self.assertEqual(self.quote1.likes, 7)
+
+    def test_invalid_weight_changes_nothing(self):
+        """Тест: недопустимый вес отклоняет всю пачку"""
+        before = self.weights()
+        with self.assertRaises(ValidationError):
+            weights.set_weights({self.quote1.pk: 3, self.quote2.pk: -1})
+        self.assertEqual(self.weights(), before)
+
+    def test_admin_action(self):
+        """Тест действия админки «Установить вес»"""
+        self.client.post(
+            self.url,
+            {
+                "action": "set_weight",
+                "_selected_action": [self.quote1.pk, self.quote3.pk],
+                "weight": 42,
+            },
+        )
+        weights = self.weights()
+        self.assertEqual(
+            (weights[self.quote1.pk], weights[self.quote2.pk], weights[self.quote3.pk]),
+            (42, 5, 42),
+        )
+
+    def test_changelist_save_uses_bulk_update(self):
+        """Тест: сохранение list_editable не вызывает Quote.save по строкам"""
+        quotes = list(Quote.all_objects.order_by("-created_at", "-id"))
+        data = {
+            "form-TOTAL_FORMS": len(quotes),
+            "form-INITIAL_FORMS": len(quotes),
+            "_save": "Сохранить",
+        }
+        for index, quote in enumerate(quotes):
+            data[f"form-{index}-id"] = quote.pk
+            data[f"form-{index}-weight"] = quote.weight + 1
+        with patch.object(Quote, "save") as save:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        save.assert_not_called()
+        self.assertEqual(
+            self.weights(), {quote.pk: quote.weight + 1 for quote in quotes}
+        )
+
+    def test_set_weights_command(self):
+        """Тест команды set_weights на файле export_quotes"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "weights.csv")
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(f"id,weight\n{self.quote2.pk},9\nnot-a-uuid,3\n")
+            call_command(
+                "set_weights",
+                path,
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+        self.assertEqual(self.weights()[self.quote2.pk], 9)
+
+
+class ArchiveTests(BaseTestSetup):
+    """Тесты архивирования неактивных строк"""
+
+    def age(self, queryset, days):
+        queryset.update(updated_at=timezone.now() - timedelta(days=days))
+
+    def archive(self, *args):
+        call_command("archive_inactive", *args, stdout=io.StringIO())
+
+    def test_archive_moves_only_old_inactive_rows(self):
+        """Тест: в архив уходят только давно неактивные цитаты"""
+        Quote.objects.filter(pk__in=[self.quote1.pk, self.quote2.pk]).delete()
+        self.age(Quote.all_objects.filter(pk=self.quote1.pk), 100)
+        self.age(Quote.all_objects.filter(pk=self.quote3.pk), 100)
+        self.archive("--older-than", "90", "--batch-size", "1")
+
+        self.assertEqual(
+            set(Quote.all_objects.values_list("pk", flat=True)),
+            {self.quote2.pk, self.quote3.pk},
+        )
+        archived = QuoteArchive.objects.get()
+        self.assertEqual(
+            (archived.pk, archived.text, archived.source_id, archived.weight),
+            (self.quote1.pk, self.quote1.text, self.movie_source.pk, 10),
+        )
+
+    def test_source_with_quotes_stays(self):
+        """Тест: источник, на который ссылаются цитаты, не архивируется"""
+        Source.objects.all().delete()
+        self.age(Source.all_objects.all(), 100)
+        Quote.objects.filter(source=self.book_source).delete()
+        self.age(Quote.all_objects.filter(source=self.book_source), 100)
+        self.archive()
+
+        self.assertQuerySetEqual(
+            Source.all_objects.values_list("pk", flat=True), [self.movie_source.pk]
+        )
+        self.assertEqual(SourceArchive.objects.get().pk, self.book_source.pk)
+
+    def test_restore_with_archived_source(self):
+        """Тест: восстановление цитаты возвращает её источник и занимает место"""
+        Quote.objects.filter(source=self.book_source).delete()
+        Source.objects.filter(pk=self.book_source.pk).delete()
+        self.age(Quote.all_objects.all(), 100)
+        self.age(Source.all_objects.filter(pk=self.book_source.pk), 100)
+        self.archive()
+        self.assertFalse(Source.all_objects.filter(pk=self.book_source.pk).exists())
+
+        self.assertEqual(QuoteArchive.objects.filter(pk=self.quote3.pk).restore(), 1)
+        quote = Quote.objects.get(pk=self.quote3.pk)
+        self.assertEqual(quote.created_at, self.quote3.created_at)
+        self.assertEqual(quote.source.active_quote_count, 1)
+        self.assertTrue(quote.source.is_active)
+        self.assertFalse(QuoteArchive.objects.exists())
+        self.assertFalse(SourceArchive.objects.exists())
+
+    def test_restore_over_limit_rolls_back(self):
+        """Тест: восстановление сверх лимита источника ничего не меняет"""
+        Quote.objects.filter(pk=self.quote3.pk).delete()
+        self.age(Quote.all_objects.filter(pk=self.quote3.pk), 100)
+        self.archive()
+        for index in range(3):
+            Quote.objects.create(text=f"Новая цитата {index}", source=self.book_source)
+
+        with self.assertRaises(CommandError):
+            self.archive("--restore", str(self.quote3.pk))
+        self.assertTrue(QuoteArchive.objects.filter(pk=self.quote3.pk).exists())
+        self.assertFalse(Quote.all_objects.filter(pk=self.quote3.pk).exists())
+
+    def test_restore_skips_quote_added_again(self):
+        """Тест: цитата, текст которой снова добавили, остаётся в архиве"""
+        Quote.objects.filter(pk=self.quote3.pk).delete()
+        self.age(Quote.all_objects.filter(pk=self.quote3.pk), 100)
+        self.archive()
+        twin = Quote.objects.create(text=self.quote3.text, source=self.movie_source)
+
+        stderr = io.StringIO()
+        call_command(
+            "archive_inactive",
+            "--restore",
+            str(self.quote3.pk),
+            stdout=io.StringIO(),
+            stderr=stderr,
+        )
+        self.assertIn(str(self.quote3.pk), stderr.getvalue())
+        self.assertTrue(QuoteArchive.objects.filter(pk=self.quote3.pk).exists())
+        self.assertQuerySetEqual(
+            Quote.all_objects.filter(text_hash=twin.text_hash), [twin]
+        )
+
+    def test_restore_merges_into_recreated_source(self):
+        """Тест: источник, созданный заново после архивирования, принимает цитаты"""
+        Quote.objects.filter(source=self.book_source).delete()
+        Source.objects.filter(pk=self.book_source.pk).delete()
+        self.age(Quote.all_objects.all(), 100)
+        self.age(Source.all_objects.filter(pk=self.book_source.pk), 100)
+        self.archive()
+        recreated = Source.objects.create(
+            name=self.book_source.name, source_type=self.book_type
+        )
+
+        self.assertEqual(QuoteArchive.objects.filter(pk=self.quote3.pk).restore(), 1)
+        quote = Quote.objects.get(pk=self.quote3.pk)
+        self.assertEqual(quote.source_id, recreated.pk)
+        self.assertEqual(quote.source.active_quote_count, 1)
+        self.assertFalse(SourceArchive.objects.exists())
+
+
+class StaticPipelineTests(BaseTestSetup):
+    """Тесты сборки и отдачи статики"""
+
+    def collect(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STATIC_ROOT=directory))
+        call_command("collectstatic", interactive=False, verbosity=0)
+        return directory
+
+    def get(self, layer, path, **environ):
+        environ["PATH_INFO"] = path
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response.update(status=status, headers=dict(headers))
+
+        body = b"".join(layer(environ, start_response))
+        return response["status"], response["headers"], body
+
+    def test_collectstatic_writes_hashed_gzip_copies(self):
+        """Тест: collectstatic пишет файлы с хэшем и копии .gz"""
+        directory = self.collect()
+        with open(os.path.join(directory, "staticfiles.json")) as handle:
+            paths = json.load(handle)["paths"]
+        hashed = paths["myapp/quote.css"]
+        self.assertRegex(hashed, r"^myapp/quote\.[0-9a-f]{12}\.css$")
+        with open(os.path.join(directory, hashed), "rb") as handle:
+            content = handle.read()
+        with open(os.path.join(directory, hashed + ".gz"), "rb") as handle:
+            self.assertEqual(gzip.decompress(handle.read()), content)
+        self.assertIn(b"var(--bg-image)", content)
+
+    def populate_without_manifest(self):
+        """STATIC_ROOT с файлами, но без staticfiles.json"""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        shutil.copytree(settings.STATICFILES_DIRS[0], directory, dirs_exist_ok=True)
+        self.enterContext(override_settings(STATIC_ROOT=directory))
+        return directory
+
+    def test_committed_static_root_has_page_stylesheets(self):
+        """Тест: статика в репозитории содержит все CSS, подключённые страницами"""
+        for page in ("random_quote_view", "top_quotes", "trending"):
+            content = self.client.get(reverse(page)).content.decode()
+            stylesheets = re.findall(r'href="/static/([^"]+\.css)"', content)
+            self.assertIn("myapp/style.css", stylesheets)
+            for name in stylesheets:
+                self.assertTrue(
+                    os.path.isfile(os.path.join(settings.STATIC_ROOT, name)), name
+                )
+
+    def test_files_without_manifest_linked_by_plain_name(self):
+        """Тест: без манифеста ссылка ведёт на существующий файл без хэша"""
+        directory = self.populate_without_manifest()
+        url = staticfiles_storage.url("myapp/style.css")
+        self.assertEqual(url, "/static/myapp/style.css")
+
+        layer = StaticFilesLayer(lambda environ, start_response: [], root=directory)
+        status, headers, _ = self.get(layer, url)
+        self.assertEqual(status, "200 OK")
+        self.assertNotIn("immutable", headers["Cache-Control"])
+
+    def test_layer_serves_hashed_files_forever(self):
+        """Тест: файл с хэшем отдаётся сжатым и с годовым кэшем"""
+
+        def application(environ, start_response):
+            start_response("404 Not Found", [])
+            return [b"django"]
+
+        directory = self.collect()
+        layer = StaticFilesLayer(application, root=directory)
+        url = staticfiles_storage.url("myapp/quote.css")
+
+        status, headers, body = self.get(layer, url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(status, "200 OK")
+        self.assertIn("immutable", headers["Cache-Control"])
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Content-Length"], str(len(body)))
+        self.assertEqual(headers["Content-Type"], "text/css; charset=utf-8")
+        plain = self.get(layer, url)[2]
+        self.assertEqual(gzip.decompress(body), plain)
+
+        status, _, body = self.get(
+            layer, url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=headers["ETag"]
+        )
+        self.assertEqual((status, body), ("304 Not Modified", b""))
+        # Несжатый вариант — другое представление с другим ETag
+        self.assertEqual(
+            self.get(layer, url, HTTP_IF_NONE_MATCH=headers["ETag"])[0], "200 OK"
+        )
+        status, headers, _ = self.get(layer, "/static/myapp/quote.css")
+        self.assertEqual(headers["Cache-Control"], "public, max-age=60")
+        self.assertEqual(self.get(layer, "/static/missing.css")[2], b"django")
+        self.assertEqual(self.get(layer, "/catalog/")[2], b"django")
+        status = self.get(layer, url, REQUEST_METHOD="POST")[0]
+        self.assertEqual(status, "405 Method Not Allowed")
+
+    def test_pages_link_stylesheets(self):
+        """Тест: страницы подключают CSS файлами, без встроенных стилей"""
+        for name, page in (
+            ("quote", "random_quote_view"),
+            ("top_quotes", "top_quotes"),
+        ):
+            response = self.client.get(reverse(page))
+            self.assertNotContains(response, "<style>")
+            self.assertContains(response, static(f"myapp/{name}.css"))
+            self.assertContains(response, "--bg-image: url(")
+
+
+class BackgroundTests(BaseTestSetup):
+    """Тесты манифеста фоновых изображений"""
+
+    def png(self, width, height):
+        return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", width, height)
+
+    def static_dir(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        images = os.path.join(directory, "myapp", "image")
+        os.makedirs(os.path.join(images, "small"))
+        for path, size in (("wide.png", (1920, 1080)), ("small/wide.png", (960, 540))):
+            with open(os.path.join(images, path), "wb") as handle:
+                handle.write(self.png(*size))
+        with open(os.path.join(images, "notes.txt"), "w") as handle:
+            handle.write("не картинка")
+        self.enterContext(override_settings(STATICFILES_DIRS=[directory]))
+        return directory
+
+    def test_image_size(self):
+        """Тест чтения размеров из заголовков JPEG и PNG"""
+        with open(finders.find("myapp/image/background1.jpg"), "rb") as handle:
+            self.assertEqual(image_size(handle.read(65536)), (1200, 800))
+        self.assertEqual(image_size(self.png(640, 480)), (640, 480))
+        self.assertIsNone(image_size(b"not an image"))
+
+    def test_preloaded_urls_are_served(self):
+        """Тест: без манифеста preload и CSS ссылаются на файлы из STATIC_ROOT"""
+        static_root = self.enterContext(tempfile.TemporaryDirectory())
+        shutil.copytree(self.static_dir(), static_root, dirs_exist_ok=True)
+        self.enterContext(override_settings(STATIC_ROOT=static_root))
+        layer = StaticFilesLayer(lambda environ, start_response: [], root=static_root)
+
+        response = self.client.get(reverse("random_quote_view"))
+        urls = re.findall(r"<([^>]+)>", response["Link"])
+        self.assertEqual(
+            urls,
+            ["/static/myapp/image/small/wide.png", "/static/myapp/image/wide.png"],
+        )
+        for url in urls:
+            self.assertContains(response, url)
+            environ = {"PATH_INFO": url}
+            setup_testing_defaults(environ)
+            statuses = []
+            layer(environ, lambda status, headers: statuses.append(status))
+            self.assertEqual(statuses, ["200 OK"])
+
+    def test_discovery_once_with_small_variant(self):
+        """Тест: фоны находятся один раз, копия из small/ привязана к оригиналу"""
+        self.static_dir()
+        found = backgrounds.all_backgrounds()
+        self.assertEqual(
+            [str(background) for background in found], ["myapp/image/wide.png"]
+        )
+        background = found[0]
+        self.assertEqual((background.width, background.height), (1920, 1080))
+        self.assertEqual(background.small.url, "/static/myapp/image/small/wide.png")
+        self.assertEqual(
+            background.link_header(),
+            "</static/myapp/image/small/wide.png>; rel=preload; as=image; "
+            'media="(max-width: 960px)", '
+            "</static/myapp/image/wide.png>; rel=preload; as=image; "
+            'media="(min-width: 961px)"',
+        )
+        with patch.object(backgrounds, "discover") as discover:
+            backgrounds.choose()
+        discover.assert_not_called()
+
+    def test_pages_preload_background(self):
+        """Тест: страницы отдают preload фона в заголовке Link и в <head>"""
+        self.static_dir()
+        for page in ("random_quote_view", "top_quotes"):
+            response = self.client.get(reverse(page))
+            self.assertIn("small/wide.png>; rel=preload; as=image", response["Link"])
+            self.assertContains(
+                response,
+                '<link rel="preload" as="image" href="/static/myapp/image/small/wide.png" '
+                'media="(max-width: 960px)" fetchpriority="high">',
+            )
+            self.assertContains(response, "--bg-image-small: url(")
+
+    def test_no_backgrounds(self):
+        """Тест: без картинок страница отдаётся без фона и без Link"""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(STATICFILES_DIRS=[directory]):
+            response = self.client.get(reverse("random_quote_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Link", response)
+        self.assertNotContains(response, "--bg-image")
+
+
+class TopPageCacheTests(BaseTestSetup):
+    """Тесты условного GET и общего кэша страницы топа"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("top_quotes")
+
+    def test_not_modified_without_queries(self):
+        """Тест: совпавший ETag даёт 304 без обращений к базе"""
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_rendered_page_is_shared(self):
+        """Тест: повторный промах по ETag отдаёт готовую страницу из кэша"""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Link"], first["Link"])
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_votes_change_etag(self):
+        """Тест: лайк и дизлайк цитаты из топа меняют версию страницы"""
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)["ETag"]
+        self.client.post(reverse("like_quote", args=[self.quote3.pk]))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "👍 1")
+
+        etag = response["ETag"]
+        self.client.post(reverse("dislike_quote", args=[self.quote3.pk]))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "👎 1")
+
+    async def test_concurrent_misses_render_once(self):
+        """Тест: одновременные промахи рендерят страницу один раз"""
+        renders = []
+        version = uuid.uuid4().hex
+
+        async def render():
+            renders.append(1)
+            await asyncio.sleep(0.05)
+            return HttpResponse("страница")
+
+        responses = await asyncio.gather(
+            *(pagecache.aget_or_render("test", version, render) for _ in range(5))
+        )
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(
+            {response.content for response in responses}, {"страница".encode()}
+        )
+
+
+@override_settings(RANDOM_PAGE_POOL_SIZE=3)
+class RandomPagePoolTests(BaseTestSetup):
+    """Тесты пула готовых анонимных страниц случайной цитаты"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("random_quote_view")
+
+    def warm(self):
+        for slot in range(3):
+            randompool.pool.refresh(slot)
+
+    def variants(self):
+        return [cache.get(randompool._key(slot)) for slot in range(3)]
+
+    def test_served_without_queries_and_view_attributed(self):
+        """Тест: анонимная страница из пула без запросов, просмотр — показанной цитате"""
+        self.warm()
+        with patch.object(viewcounts, "record_view") as record_view:
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        record_view.assert_called_once()
+        served = Quote.objects.get(pk=record_view.call_args.args[0])
+        self.assertContains(response, served.text)
+        self.assertIn("rel=preload", response["Link"])
+
+    def test_variants_respect_weight(self):
+        """Тест: варианты выбираются взвешенной выборкой"""
+        Quote.objects.exclude(pk=self.quote1.pk).update(weight=0)
+        sampling.invalidate()
+        for _ in range(5):
+            self.assertContains(self.client.get(self.url), self.quote1.text)
+
+    def test_stale_variant_redrawn_after_response(self):
+        """Тест: устаревший вариант отдаётся и перерисовывается после ответа"""
+        self.warm()
+        for slot, variant in enumerate(self.variants()):
+            variant["rendered_at"] -= 3600
+            cache.set(randompool._key(slot), variant)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        ages = [time.time() - variant["rendered_at"] for variant in self.variants()]
+        self.assertEqual(len([age for age in ages if age < 60]), 1)
+
+    def test_authenticated_user_bypasses_pool(self):
+        """Тест: авторизованный пользователь получает свою страницу"""
+        self.warm()
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "myapp/quote.html")
+        self.assertContains(response, self.user.username)
+
+    def test_soft_delete_clears_pool(self):
+        """Тест: удаление цитаты сбрасывает готовые варианты"""
+        self.warm()
+        self.quote1.delete()
+        self.assertEqual(self.variants(), [None, None, None])
+
+    def test_weight_change_clears_pool(self):
+        """Тест: смена веса сбрасывает варианты, выбранные по старым весам"""
+        self.warm()
+        self.quote2.weight = 1
+        self.quote2.save(update_fields=["weight"])
+        self.assertEqual(self.variants(), [None, None, None])
+
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            set_weights({self.quote1.pk: 1})
+        self.assertEqual(self.variants(), [None, None, None])
+
+
+class TrendingTests(BaseTestSetup):
+    """Тесты почасовых сводок и затухающего рейтинга трендов"""
+
+    def test_votes_and_views_rolled_up_by_hour(self):
+        """Тест: голоса и пачка просмотров пишутся в одну строку цитаты за час"""
+        self.client.login(username="testuser", password="testpass123")
+        for _ in range(2):
+            self.client.post(reverse("like_quote", args=[self.quote1.pk]))
+        self.client.post(reverse("dislike_quote", args=[self.quote1.pk]))
+        for _ in range(3):
+            viewcounts.record_view(self.quote1.pk)
+        viewcounts.flush()
+        self.assertFalse(QuoteActivity.objects.exists())
+
+        self.assertEqual(trending.flush(), 6)
+        trending.record(self.quote1.pk, "likes")
+        trending.flush()
+        activity = QuoteActivity.objects.get()
+        self.assertEqual(
+            (activity.quote_id, activity.views, activity.likes, activity.dislikes),
+            (self.quote1.pk, 3, 3, 1),
+        )
+        self.assertEqual(activity.hour.minute, 0)
+
+    def test_flush_queries_do_not_grow_with_events(self):
+        """Тест: запись буфера — одна пачка запросов на час, а не на событие"""
+        for quote in (self.quote1, self.quote2, self.quote3):
+            for _ in range(5):
+                trending.record(quote.pk, "likes")
+        # Проверка цитат, по два запроса на сводки и на оценки
+        with self.assertNumQueries(5 + 2):
+            trending.flush()
+
+    def test_older_activity_decays(self):
+        """Тест: старые лайки весят меньше свежих, пересчёт даёт те же оценки"""
+        hour = trending.truncate_hour(timezone.now())
+        trending.write_activity(
+            {
+                (self.quote1.pk, hour - timezone.timedelta(hours=48), "likes"): 5,
+                (self.quote2.pk, hour, "likes"): 2,
+                (self.quote3.pk, hour, "dislikes"): 1,
+            }
+        )
+        quotes = trending.quotes()
+        self.assertEqual(
+            [quote.pk for quote in quotes], [self.quote2.pk, self.quote1.pk]
+        )
+        # Полураспад сутки: пять лайков двухдневной давности — как 1.25 свежих
+        self.assertAlmostEqual(
+            quotes[1].trending_score / quotes[0].trending_score, 1.25 / 2, places=2
+        )
+
+        incremental = dict(TrendingScore.objects.values_list("quote_id", "score"))
+        trending.rebuild_scores()
+        for pk, score in TrendingScore.objects.values_list("quote_id", "score"):
+            self.assertAlmostEqual(score, incremental[pk])
+
+    def test_scores_carry_over_to_next_era(self):
+        """Тест: при смене эпохи оценка затухает, а не обнуляется"""
+        era = trending.era_of(trending.EPOCH) + 10
+        start = trending.era_start(era)
+        next_start = trending.era_start(era + 1)
+        trending.write_activity({(self.quote1.pk, start, "likes"): 4}, now=start)
+        trending.write_activity(
+            {(self.quote2.pk, next_start, "likes"): 1}, now=next_start
+        )
+        trending.write_activity(
+            {(self.quote1.pk, next_start, "likes"): 1}, now=next_start
+        )
+        score = TrendingScore.objects.get(quote=self.quote1)
+        self.assertEqual(score.era, era + 1)
+        # Четыре лайка восемь полураспадов назад плюс один свежий
+        self.assertAlmostEqual(score.score, 4 * 2**-8 + 1)
+
+    def test_page_served_from_ranking(self):
+        """Тест: страница трендов читает готовый топ, а не сводки"""
+        hour = trending.truncate_hour(timezone.now())
+        trending.write_activity({(self.quote3.pk, hour, "likes"): 1})
+        url = reverse("trending")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "myapp/trending.html")
+        self.assertContains(response, self.quote3.text)
+        self.assertNotContains(response, self.quote1.text)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("quoteactivity", tables)
+        self.assertNotIn("trendingscore", tables)
+
+    def test_hidden_quote_leaves_page(self):
+        """Тест: скрытая цитата не показывается и архивируется вместе со сводками"""
+        hour = trending.truncate_hour(timezone.now())
+        trending.write_activity({(self.quote3.pk, hour, "likes"): 1})
+        trending.quotes()
+        Quote.objects.filter(pk=self.quote3.pk).delete()
+        self.assertEqual(trending.quotes(), [])
+
+        Quote.all_objects.filter(pk=self.quote3.pk).archive()
+        self.assertTrue(QuoteArchive.objects.filter(pk=self.quote3.pk).exists())
+        self.assertFalse(QuoteActivity.objects.exists())
+
+
 class AuthenticationTests(TestCase):
     """Тесты аутентификации"""
 
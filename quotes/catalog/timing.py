@@ -0,0 +1,83 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("catalog_request_timings", default=None)
+# Замеры, которые считают SQL-запросы текущего контекста. Обёртка стоит на
+# каждом соединении (connection_created), а контекст копируется в потоки
+# sync_to_async, поэтому учитываются и запросы асинхронных представлений.
+_collectors = ContextVar("catalog_query_collectors", default=())
+
+
+class RequestTimings:
+    """Счётчики одного запроса: число SQL-запросов и длительности по разделам"""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.durations["db"] += seconds
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """execute_wrapper соединений: передаёт запрос замерам текущего контекста"""
+    collectors = _collectors.get()
+    if not collectors:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for timings in collectors:
+            timings.add_query(elapsed)
+
+
+def install(connection):
+    """Ставит db_wrapper на соединение один раз"""
+    if db_wrapper not in connection.execute_wrappers:
+        # В начало списка: execute_wrapper() снимает последнюю обёртку, и
+        # соединение, открытое внутри такого блока, не должно её подменить
+        connection.execute_wrappers.insert(0, db_wrapper)
+
+
+@contextmanager
+def collect_queries(timings):
+    """Считает в timings SQL-запросы этого контекста и его потоков"""
+    token = _collectors.set(_collectors.get() + (timings,))
+    try:
+        yield
+    finally:
+        _collectors.reset(token)
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Замеряет блок кода, если для текущего запроса включены замеры"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
@@ -0,0 +1,401 @@
+"""Тренды: почасовые сводки активности и затухающий рейтинг цитат.
+
+Голоса и просмотры копятся в памяти процесса и пачкой пишутся в почасовые
+сводки QuoteActivity (как буфер просмотров). Той же транзакцией обновляется
+TrendingScore: вклад события весит TRENDING_WEIGHTS[вид] и убывает вдвое за
+TRENDING_HALF_LIFE_HOURS.
+
+Затухание прямое (forward decay): вместо того чтобы уменьшать все оценки со
+временем, новый вклад умножается на 2 ** ((час - начало эпохи) / полураспад).
+Порядок оценок внутри эпохи от этого не меняется, поэтому запись трогает
+только цитаты с новой активностью. Эпоха длится ERA_HALF_LIVES полураспадов,
+чтобы множители не росли без предела; оценка прошлой эпохи при сравнении
+умножается на 2 ** -ERA_HALF_LIVES, более старые считаются нулевыми.
+
+Страница трендов читает готовый рейтинг: топ перечитывается из TrendingScore
+не чаще раза в TRENDING_MAX_AGE секунд.
+"""
+
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from . import metrics
+from .models import Quote, QuoteActivity, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("views", "likes", "dislikes")
+DEFAULT_WEIGHTS = {"views": 0.05, "likes": 1.0, "dislikes": -1.0}
+DEFAULT_HALF_LIFE_HOURS = 24
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_FLUSH_THRESHOLD = 500
+DEFAULT_SIZE = 20
+DEFAULT_MAX_AGE = 60
+# Начало отсчёта эпох; выровнено по часу, как и сводки
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+ERA_HALF_LIVES = 8
+# Сколько цитат обновлять одним UPDATE ... CASE
+BATCH_SIZE = 500
+
+
+def half_life():
+    """Полураспад вклада в секундах"""
+    hours = getattr(settings, "TRENDING_HALF_LIFE_HOURS", DEFAULT_HALF_LIFE_HOURS)
+    return hours * 3600
+
+
+def weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, "TRENDING_WEIGHTS", {})}
+
+
+def era_length():
+    return half_life() * ERA_HALF_LIVES
+
+
+def era_of(moment):
+    return math.floor((moment - EPOCH).total_seconds() / era_length())
+
+
+def era_start(era):
+    return EPOCH + timedelta(seconds=era * era_length())
+
+
+def growth(moment, era):
+    """Множитель вклада события в момент moment для оценок эпохи era"""
+    elapsed = (moment - era_start(era)).total_seconds()
+    return 2.0 ** (elapsed / half_life())
+
+
+def truncate_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def current_score(era):
+    """Выражение оценки в масштабе эпохи era: прошлая эпоха затухает, старше — 0"""
+    return Case(
+        When(era=era, then=F("score")),
+        When(era=era - 1, then=F("score") * Value(2.0**-ERA_HALF_LIVES)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def _increments(amounts, default):
+    return Case(
+        *[When(quote_id=pk, then=Value(amount)) for pk, amount in amounts],
+        default=Value(default),
+    )
+
+
+def write_activity(pending, now=None):
+    """Пишет {(id цитаты, час, вид): число} в сводки и оценки одной транзакцией.
+
+    Возвращает число записанных событий; события удалённых цитат пропускаются.
+    """
+    now = now or timezone.now()
+    era = era_of(now)
+    rates = weights()
+    existing = set(
+        Quote.all_objects.filter(pk__in={pk for pk, _, _ in pending}).values_list(
+            "pk", flat=True
+        )
+    )
+    by_hour = defaultdict(lambda: defaultdict(Counter))
+    deltas = Counter()
+    written = 0
+    for (pk, hour, kind), amount in pending.items():
+        if pk not in existing:
+            continue
+        by_hour[hour][pk][kind] += amount
+        deltas[pk] += rates[kind] * amount * growth(hour, era)
+        written += amount
+
+    with transaction.atomic():
+        for hour, counts in by_hour.items():
+            items = list(counts.items())
+            for start in range(0, len(items), BATCH_SIZE):
+                batch = items[start : start + BATCH_SIZE]
+                ids = [pk for pk, _ in batch]
+                QuoteActivity.objects.bulk_create(
+                    [QuoteActivity(quote_id=pk, hour=hour) for pk in ids],
+                    ignore_conflicts=True,
+                )
+                QuoteActivity.objects.filter(hour=hour, quote_id__in=ids).update(
+                    **{
+                        kind: F(kind)
+                        + _increments(
+                            [(pk, kinds[kind]) for pk, kinds in batch if kinds[kind]],
+                            0,
+                        )
+                        for kind in KINDS
+                        if any(kinds[kind] for _, kinds in batch)
+                    }
+                )
+        items = list(deltas.items())
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start : start + BATCH_SIZE]
+            ids = [pk for pk, _ in batch]
+            TrendingScore.objects.bulk_create(
+                [TrendingScore(quote_id=pk, era=era) for pk in ids],
+                ignore_conflicts=True,
+            )
+            # Правая часть SET читает старые score и era, поэтому перевод в
+            # новую эпоху и прибавка вклада — один UPDATE
+            TrendingScore.objects.filter(quote_id__in=ids).update(
+                score=current_score(era) + _increments(batch, 0.0),
+                era=era,
+            )
+    return written
+
+
+def rebuild_scores(now=None):
+    """Пересчитывает все оценки из сводок текущей и прошлой эпохи"""
+    now = now or timezone.now()
+    era = era_of(now)
+    rates = weights()
+    scores = Counter()
+    rows = QuoteActivity.objects.filter(hour__gte=era_start(era - 1)).values_list(
+        "quote_id", "hour", *KINDS
+    )
+    for pk, hour, *amounts in rows.iterator():
+        factor = growth(hour, era)
+        scores[pk] += factor * sum(
+            rates[kind] * amount for kind, amount in zip(KINDS, amounts)
+        )
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(quote_id=pk, score=score, era=era)
+                for pk, score in scores.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    ranking.invalidate()
+    return len(scores)
+
+
+class ActivityBuffer:
+    """Буфер голосов и просмотров: копит события по цитате, часу и виду"""
+
+    def __init__(self, flush_interval=None, flush_threshold=None):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._events = 0
+        self._last_flush = time.monotonic()
+
+    def _setting(self, value, name, default):
+        return value if value is not None else getattr(settings, name, default)
+
+    def add(self, quote_id, kind, amount=1):
+        self.add_many(kind, {quote_id: amount})
+
+    def add_many(self, kind, amounts):
+        """Учитывает события вида kind: {id цитаты: число} за текущий час"""
+        hour = truncate_hour(timezone.now())
+        with self._lock:
+            for pk, amount in amounts.items():
+                self._pending[pk, hour, kind] += amount
+                self._events += amount
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def is_due(self):
+        with self._lock:
+            if not self._pending:
+                return False
+            events = self._events
+            elapsed = time.monotonic() - self._last_flush
+        threshold = self._setting(
+            self.flush_threshold, "TRENDING_FLUSH_THRESHOLD", DEFAULT_FLUSH_THRESHOLD
+        )
+        interval = self._setting(
+            self.flush_interval, "TRENDING_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL
+        )
+        return events >= threshold or elapsed >= interval
+
+    def flush(self):
+        """Записывает накопленные события, возвращает их число"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._events = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            return write_activity(pending)
+        except DatabaseError:
+            # Не теряем события: вернём их в буфер до следующей попытки
+            with self._lock:
+                self._pending.update(pending)
+                self._events += sum(pending.values())
+            raise
+
+    def clear(self):
+        """Отбрасывает накопленные события без записи и заново отсчитывает интервал"""
+        with self._lock:
+            self._pending.clear()
+            self._events = 0
+            self._last_flush = time.monotonic()
+
+
+class TrendingRanking:
+    """Топ цитат по затухающей оценке, перечитываемый из TrendingScore"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = None  # [(id, оценка на момент загрузки), ...]
+        self._loaded_at = 0.0
+
+    def _max_age(self):
+        return getattr(settings, "TRENDING_MAX_AGE", DEFAULT_MAX_AGE)
+
+    def _is_fresh(self):
+        fresh = (
+            self._entries is not None
+            and time.monotonic() - self._loaded_at < self._max_age()
+        )
+        metrics.record_cache("trending", fresh)
+        return fresh
+
+    def _top_rows(self):
+        era = era_of(timezone.now())
+        return (
+            TrendingScore.objects.filter(era__gte=era - 1, quote__is_active=True)
+            .annotate(current=current_score(era))
+            .filter(current__gt=0)
+            .order_by("-current")
+            .values_list("quote_id", "current")[: self.size]
+        )
+
+    def _store(self, rows):
+        # Оценка в масштабе эпохи переводится в затухшую к текущему моменту
+        now = timezone.now()
+        scale = growth(now, era_of(now))
+        entries = [(pk, current / scale) for pk, current in rows]
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def load(self):
+        self._store(self._top_rows())
+
+    async def aload(self):
+        self._store([row async for row in self._top_rows()])
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._entries or [])
+
+    def entries(self):
+        """[(id цитаты, оценка)] по убыванию оценки"""
+        if not self._is_fresh():
+            self.load()
+        return self._snapshot()
+
+    async def aentries(self):
+        if not self._is_fresh():
+            await self.aload()
+        return self._snapshot()
+
+    def _quotes(self, entries):
+        return (
+            Quote.objects.filter(pk__in=[pk for pk, _ in entries])
+            .select_related("source__source_type")
+            .order_by()
+        )
+
+    def _ordered(self, entries, quotes):
+        by_id = {quote.pk: quote for quote in quotes}
+        ordered = []
+        for pk, score in entries:
+            # Цитату могли скрыть после загрузки рейтинга
+            if pk in by_id:
+                by_id[pk].trending_score = score
+                ordered.append(by_id[pk])
+        return ordered
+
+    def quotes(self):
+        """Цитаты рейтинга с источниками и атрибутом trending_score"""
+        entries = self.entries()
+        return self._ordered(entries, self._quotes(entries))
+
+    async def aquotes(self):
+        entries = await self.aentries()
+        return self._ordered(entries, [quote async for quote in self._quotes(entries)])
+
+
+buffer = ActivityBuffer()
+ranking = TrendingRanking()
+
+metrics.registry.register(
+    metrics.Gauge(
+        "catalog_trending_buffer_pending",
+        "Несброшенные события трендов в буфере процесса",
+        lambda: sum(buffer.pending().values()),
+    )
+)
+
+
+def record(quote_id, kind):
+    buffer.add(quote_id, kind)
+
+
+def record_many(kind, amounts):
+    buffer.add_many(kind, amounts)
+
+
+def flush():
+    return buffer.flush()
+
+
+def flush_if_due():
+    if not buffer.is_due():
+        return
+    try:
+        buffer.flush()
+    except DatabaseError:
+        logger.exception("Не удалось записать сводки активности")
+
+
+def flush_on_exit():
+    try:
+        buffer.flush()
+    except DatabaseError:
+        logger.exception("Не удалось записать сводки активности при остановке")
+
+
+def invalidate():
+    ranking.invalidate()
+
+
+def quotes():
+    return ranking.quotes()
+
+
+async def aquotes():
+    return await ranking.aquotes()
+
+
+# viewcounts импортирует этот модуль, поэтому этот обработчик регистрируется
+# раньше и выполняется после сброса просмотров, которые попадают и сюда
+atexit.register(flush_on_exit)
@@ -9,4 +9,6 @@ urlpatterns = [
     path("accounts/login/", views.CustomLoginView.as_view(), name="login"),
     path("add-quote/", views.add_quote, name="add_quote"),
     path("top/", views.top_quotes_view, name="top_quotes"),
+    path("trending/", views.trending_view, name="trending"),
+    path("export/", views.export_quotes, name="export_quotes"),
 ]
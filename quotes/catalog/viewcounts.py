@@ -0,0 +1,168 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, When
+
+from . import metrics, trending
+from .models import Quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_FLUSH_THRESHOLD = 100
+# Ключ кэша, через который flush_view_counts просит воркеры сбросить буфер.
+# Работает между процессами только с общим бэкендом CACHES.
+FLUSH_REQUEST_KEY = "catalog:viewcounts:flush_requested"
+# Сколько цитат обновлять одним UPDATE ... CASE
+BATCH_SIZE = 500
+
+
+class ViewCountBuffer:
+    """Буфер просмотров: копит инкременты по id цитаты и сбрасывает их пачкой"""
+
+    def __init__(self, flush_interval=None, flush_threshold=None):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._hits = 0
+        self._last_flush = time.monotonic()
+        self._last_flush_time = time.time()
+        self._first_pending_at = None
+
+    def _setting(self, value, name, default):
+        return value if value is not None else getattr(settings, name, default)
+
+    def add(self, quote_id, amount=1):
+        """Учитывает просмотр без обращения к базе"""
+        with self._lock:
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            self._pending[quote_id] += amount
+            self._hits += 1
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def pending_age(self):
+        """Сколько секунд ждёт самый старый несброшенный просмотр"""
+        with self._lock:
+            if self._first_pending_at is None:
+                return 0.0
+            return time.monotonic() - self._first_pending_at
+
+    def is_due(self):
+        """Пора ли сбрасывать: по числу хитов, по времени или по запросу команды"""
+        with self._lock:
+            if not self._pending:
+                return False
+            hits = self._hits
+            elapsed = time.monotonic() - self._last_flush
+        threshold = self._setting(
+            self.flush_threshold, "VIEW_COUNT_FLUSH_THRESHOLD", DEFAULT_FLUSH_THRESHOLD
+        )
+        interval = self._setting(
+            self.flush_interval, "VIEW_COUNT_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL
+        )
+        if hits >= threshold or elapsed >= interval:
+            return True
+        requested = cache.get(FLUSH_REQUEST_KEY)
+        return requested is not None and requested > self._last_flush_time
+
+    def flush(self):
+        """Записывает накопленные просмотры одной транзакцией, возвращает их число"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            first_pending_at, self._first_pending_at = self._first_pending_at, None
+            self._hits = 0
+            self._last_flush = time.monotonic()
+            self._last_flush_time = time.time()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                items = list(pending.items())
+                for start in range(0, len(items), BATCH_SIZE):
+                    batch = items[start : start + BATCH_SIZE]
+                    Quote.all_objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                        views=F("views")
+                        + Case(*[When(pk=pk, then=amount) for pk, amount in batch])
+                    )
+        except DatabaseError:
+            # Не теряем просмотры: вернём их в буфер до следующей попытки
+            with self._lock:
+                self._pending.update(pending)
+                self._first_pending_at = min(
+                    first_pending_at, self._first_pending_at or first_pending_at
+                )
+            raise
+        # Тренды получают просмотры той же пачкой, а не по одному
+        trending.record_many("views", pending)
+        metrics.view_flush_lag.observe(time.monotonic() - first_pending_at)
+        return sum(pending.values())
+
+    def clear(self):
+        """Отбрасывает накопленные просмотры без записи и заново отсчитывает интервал"""
+        with self._lock:
+            self._pending.clear()
+            self._first_pending_at = None
+            self._hits = 0
+            self._last_flush = time.monotonic()
+
+
+buffer = ViewCountBuffer()
+
+metrics.registry.register(
+    metrics.Gauge(
+        "catalog_view_buffer_pending",
+        "Несброшенные просмотры в буфере процесса",
+        lambda: sum(buffer.pending().values()),
+    )
+)
+metrics.registry.register(
+    metrics.Gauge(
+        "catalog_view_buffer_age_seconds",
+        "Возраст самого старого несброшенного просмотра",
+        buffer.pending_age,
+    )
+)
+
+
+def record_view(quote_id):
+    buffer.add(quote_id)
+
+
+def flush():
+    return buffer.flush()
+
+
+def request_flush():
+    """Просит все воркеры сбросить буферы на ближайшем запросе"""
+    cache.set(FLUSH_REQUEST_KEY, time.time(), None)
+
+
+def flush_if_due():
+    if not buffer.is_due():
+        return
+    try:
+        buffer.flush()
+    except DatabaseError:
+        logger.exception("Не удалось записать буфер просмотров")
+
+
+def flush_on_exit():
+    try:
+        buffer.flush()
+    except DatabaseError:
+        logger.exception("Не удалось записать буфер просмотров при остановке")
+
+
+atexit.register(flush_on_exit)
@@ -1,74 +1,141 @@
-import random
-from random import choice
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
-from django.db.models import Sum
 from django.forms import ValidationError
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response
 from django.views.decorators.http import require_POST
 
+from . import (
+    backgrounds,
+    counters,
+    export,
+    leaderboard,
+    metrics,
+    pagecache,
+    randompool,
+    routers,
+    sampling,
+    timing,
+    trending,
+    viewcounts,
+)
 from .forms import QuoteForm
 from .models import Quote
 
 
+def render_page(request, template_name, context):
+    with timing.span("render"):
+        return render(request, template_name, context)
+
+
+async def arender_page(request, template_name, context):
+    # Шаблон лениво читает пользователя из сессии и варианты формы из базы,
+    # поэтому рендерится в потоке базы, а не в цикле событий.
+    return await sync_to_async(render_page)(request, template_name, context)
+
+
+def _quote_with_source(quote_id):
+    return Quote.objects.select_related("source__source_type").filter(pk=quote_id)
+
+
 def get_random_quote():
-    total_weight = Quote.objects.aggregate(total=Sum("weight"))["total"]
-    if not total_weight:
-        return None
-    random_weight = random.uniform(0, total_weight)
-    current = 0
-    for quote in (
-        Quote.objects.all().filter(is_active=True).only("id", "weight").order_by("id")
-    ):
-        current += quote.weight
-        if current >= random_weight:
-            return Quote.objects.get(pk=quote.pk)
-
-
-def random_quote_view(request):
-    quote = get_random_quote()
+    with routers.replica_reads():
+        return _pick_random_quote()
+
+
+def _pick_random_quote():
+    for _ in range(2):
+        with timing.span("sampler"):
+            quote_id = sampling.get_sampler().pick()
+        if quote_id is None:
+            return None
+        quote = _quote_with_source(quote_id).first()
+        if quote is not None:
+            return quote
+        # Цитату удалили в другом процессе или транзакции — таблица устарела
+        sampling.invalidate()
+    return None
+
+
+async def aget_random_quote():
+    with routers.replica_reads():
+        return await _apick_random_quote()
+
+
+async def _apick_random_quote():
+    for _ in range(2):
+        with timing.span("sampler"):
+            quote_id = (await sampling.aget_sampler()).pick()
+        if quote_id is None:
+            return None
+        quote = await _quote_with_source(quote_id).afirst()
+        if quote is not None:
+            return quote
+        sampling.invalidate()
+    return None
+
+
+async def random_quote_view(request):
+    if await randompool.aserves(request):
+        return await randompool.aserve()
+    quote = await aget_random_quote()
     if quote:
-        quote.views += 1  # Предполагается, что в модели Quote есть поле views
-        quote.save(update_fields=["views"])
-    bg_image = get_random_background_image()
-    bg_path = f"myapp/image/{bg_image}"
+        viewcounts.record_view(quote.pk)
+        quote.views += 1
+    background = get_random_background_image()
     form = QuoteForm()
-    return render(
-        request, "myapp/quote.html", {"quote": quote, "bg_path": bg_path, "form": form}
+    response = await arender_page(
+        request,
+        "myapp/quote.html",
+        {"quote": quote, "background": background, "form": form},
     )
+    return with_preload(response, background)
 
 
 def get_random_background_image():
-    images_files = [
-        "background1.jpg",
-        "background2.jpg",
-        "background3.jpg",
-        "background4.jpg",
-    ]
-    selected = choice(images_files)
-    return f"{selected}"
+    """Случайный фон из манифеста backgrounds или None"""
+    return backgrounds.choose()
+
+
+def with_preload(response, background):
+    """Заголовок Link: браузер начинает грузить фон до разбора HTML и CSS"""
+    if background is not None:
+        response["Link"] = background.link_header()
+    return response
 
 
 @login_required
 @require_POST
-def like_quote(request, quote_id):
-    quote = get_object_or_404(Quote, id=quote_id)
-    quote.likes += 1
-    quote.save(update_fields=["likes"])
-    return JsonResponse({"status": "ok", "new_likes": quote.likes})
+async def like_quote(request, quote_id):
+    new_likes = await counters.aincrement(quote_id, "likes")
+    if new_likes is None:
+        raise Http404("Цитата не найдена")
+    await leaderboard.arecord_likes(quote_id, new_likes)
+    trending.record(quote_id, "likes")
+    return JsonResponse({"status": "ok", "new_likes": new_likes})
 
 
 @login_required
 @require_POST
-def dislike_quote(request, quote_id):
-    quote = get_object_or_404(Quote, id=quote_id)
-    quote.dislikes += 1
-    quote.save(update_fields=["dislikes"])
-    return JsonResponse({"status": "ok", "new_dislikes": quote.dislikes})
+async def dislike_quote(request, quote_id):
+    new_dislikes = await counters.aincrement(quote_id, "dislikes")
+    if new_dislikes is None:
+        raise Http404("Цитата не найдена")
+    await leaderboard.arecord_change(quote_id)
+    trending.record(quote_id, "dislikes")
+    return JsonResponse({"status": "ok", "new_dislikes": new_dislikes})
 
 
 class CustomLoginView(LoginView):
@@ -105,16 +172,81 @@ def add_quote(request):
         form = QuoteForm()
 
     quote = get_random_quote()
-    bg_path = f"myapp/image/{get_random_background_image()}"
+    background = get_random_background_image()
 
-    return render(
-        request, "myapp/quote.html", {"quote": quote, "bg_path": bg_path, "form": form}
+    response = render_page(
+        request,
+        "myapp/quote.html",
+        {"quote": quote, "background": background, "form": form},
     )
+    return with_preload(response, background)
 
 
-def top_quotes_view(request):
-    top_quotes = Quote.objects.filter(is_active=True).order_by("-likes")[:20]
-    bg_path = f"myapp/image/{get_random_background_image()}"
-    return render(
-        request, "myapp/top_quotes.html", {"top_quotes": top_quotes, "bg_path": bg_path}
+async def _render_top_quotes(request):
+    with routers.replica_reads():
+        top_quotes = await leaderboard.atop_quotes()
+    background = get_random_background_image()
+    response = await arender_page(
+        request,
+        "myapp/top_quotes.html",
+        {"top_quotes": top_quotes, "background": background},
+    )
+    return with_preload(response, background)
+
+
+async def top_quotes_view(request):
+    # Страница одинакова для всех, пока не сменилась версия топа: повторный
+    # визит получает 304, не дойдя до таблицы цитат
+    version = await leaderboard.aetag()
+    etag = f'"top-{version}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = await pagecache.aget_or_render(
+            "top", version, lambda: _render_top_quotes(request)
+        )
+    else:
+        response = not_modified
+    response["ETag"] = etag
+    # Кэшировать можно, но каждый раз с проверкой версии
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+async def trending_view(request):
+    # Рейтинг уже посчитан при записи сводок: страница берёт готовый топ
+    with routers.replica_reads():
+        trending_quotes = await trending.aquotes()
+    background = get_random_background_image()
+    response = await arender_page(
+        request,
+        "myapp/trending.html",
+        {"trending_quotes": trending_quotes, "background": background},
+    )
+    return with_preload(response, background)
+
+
+@staff_member_required
+def export_quotes(request):
+    file_format = request.GET.get("format", "csv")
+    if file_format not in export.FORMATS:
+        file_format = "csv"
+    response = StreamingHttpResponse(
+        export.iter_export(
+            file_format, include_inactive=request.GET.get("inactive") == "1"
+        ),
+        content_type=export.FORMATS[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="quotes.{file_format}"'
+    return response
+
+
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    # Без токена метрики открыты только при разработке
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
     )
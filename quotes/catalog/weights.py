@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import randompool, sampling
+from .models import Quote
+
+BATCH_SIZE = 500
+
+
+def weights_changed():
+    sampling.invalidate()
+    randompool.clear()
+
+
+def set_weights(weights, batch_size=BATCH_SIZE):
+    """Массово меняет веса цитат: {id: вес} -> (изменено, id не найденных цитат).
+
+    Все изменения пишутся bulk_update в одной транзакции, без Quote.save() на
+    каждую строку, и обновляют только вес: счётчики, которые параллельно
+    увеличивают голоса, не перезаписываются. Таблица взвешенного выбора и пул
+    готовых страниц сбрасываются один раз после коммита. Недопустимый вес —
+    ValidationError до любых изменений.
+    """
+    pk_field = Quote._meta.pk
+    weight_field = Quote._meta.get_field("weight")
+    cleaned = {
+        pk_field.to_python(pk): weight_field.clean(weight, None)
+        for pk, weight in weights.items()
+    }
+
+    ids = list(cleaned)
+    changed = []
+    found = set()
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(ids), batch_size):
+            quotes = Quote.all_objects.filter(
+                pk__in=ids[start : start + batch_size]
+            ).only("id", "weight")
+            for quote in quotes:
+                found.add(quote.pk)
+                weight = cleaned[quote.pk]
+                if quote.weight != weight:
+                    quote.weight = weight
+                    quote.updated_at = now
+                    changed.append(quote)
+        Quote.all_objects.bulk_update(
+            changed, ["weight", "updated_at"], batch_size=batch_size
+        )
+        if changed:
+            transaction.on_commit(weights_changed)
+    return len(changed), [pk for pk in ids if pk not in found]
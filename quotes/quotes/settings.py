@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -20,13 +21,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-ваш-ключ-здесь-только-для-разработки')
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY", "django-insecure-ваш-ключ-здесь-только-для-разработки"
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
 
-
 # Application definition
 
 INSTALLED_APPS = [
@@ -37,17 +39,19 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "quotes.catalog.apps.CatalogConfig",
-
 ]
 
 MIDDLEWARE = [
+    "catalog.middleware.MetricsMiddleware",
+    "catalog.middleware.ReadReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "catalog.middleware.SlidingSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "catalog.middleware.RequestTimingMiddleware",
 ]
 
 ROOT_URLCONF = "quotes.urls"
@@ -79,6 +83,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 600,  # Постоянные соединения вместо подключения на каждый запрос
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -122,6 +128,15 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATIC_URL = "/static/"
+# collectstatic пишет копии с хэшем содержимого в имени и рядом .gz;
+# отдаёт их catalog.static_layer.StaticFilesLayer из quotes/wsgi.py
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "catalog.storage.HashedGzipStaticFilesStorage"},
+}
+STATIC_MAX_AGE = 60  # Секунд кэша для статики без хэша в имени
+BACKGROUND_IMAGE_DIR = "myapp/image"  # Каталог фонов в статике, читается один раз
+BACKGROUND_SMALL_WIDTH = 960  # Ширина копий build_backgrounds, как @media в CSS
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -131,11 +146,59 @@ LOGIN_REDIRECT_URL = "/"  # Перенаправление после успеш
 LOGIN_URL = "/accounts/login/"  # URL для страницы входа
 LOGOUT_REDIRECT_URL = "/"  # Перенапра
 SESSION_COOKIE_AGE = 1209600  # 2 недели
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # Продление сессии — SlidingSessionMiddleware
+SESSION_REFRESH_INTERVAL = 24 * 60 * 60  # Секунд между записями неизменённой сессии
 
 # settings.py
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
 
-ALLOWED_HOSTS = ['ricardsh.pythonanywhere.com']
+ALLOWED_HOSTS = ["ricardsh.pythonanywhere.com"]
+
+QUOTE_SAMPLER_MAX_AGE = 60  # Секунд до принудительной перестройки таблицы весов
+VIEW_COUNT_FLUSH_INTERVAL = 5  # Секунд между сбросами буфера просмотров
+VIEW_COUNT_FLUSH_THRESHOLD = 100  # Просмотров, после которых буфер сбрасывается сразу
+LEADERBOARD_MAX_AGE = 30  # Секунд до перечитывания топа цитат из базы
+# Отрендеренная страница топа по версии топа (catalog.pagecache). Кэш по
+# умолчанию в памяти процесса; общий бэкенд в CACHES делит её между воркерами
+PAGE_CACHE_TIMEOUT = 300  # Секунд хранения отрендеренной страницы
+PAGE_CACHE_LOCK_WAIT = 2  # Секунд ожидания чужого рендера при промахе
+# Готовые варианты анонимной страницы случайной цитаты (catalog.randompool).
+# 0 — пул выключен; общий бэкенд CACHES делит варианты между воркерами
+RANDOM_PAGE_POOL_SIZE = 0
+RANDOM_PAGE_POOL_TTL = 30  # Секунд до перерисовки варианта после показа
+# Рейтинг трендов (catalog.trending): почасовые сводки и затухающая оценка
+TRENDING_HALF_LIFE_HOURS = 24  # Часов, за которые вклад события убывает вдвое
+TRENDING_WEIGHTS = {"views": 0.05, "likes": 1.0, "dislikes": -1.0}  # Вклад события
+TRENDING_FLUSH_INTERVAL = 10  # Секунд между записями буфера сводок
+TRENDING_MAX_AGE = 60  # Секунд до перечитывания топа трендов из базы
+REQUEST_TIMING_ENABLED = False  # Заголовок Server-Timing и лог замеров по запросам
+REQUEST_QUERY_BUDGET = 10  # Запросов к базе, после которых запрос помечается в логе
+METRICS_ENABLED = True  # Гистограммы и счётчики процесса для /metrics
+# Bearer-токен для /metrics; пустой открывает метрики только при DEBUG
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Применяются к каждому соединению SQLite: busy_timeout ждёт блокировку вместо
+# мгновенной ошибки. Допустимые имена — SQLITE_PRAGMA_NAMES в catalog/signals.py.
+# Режим WAL, при котором читатели не ждут запись счётчиков, хранится в файле
+# базы и включается при развёртывании один раз: manage.py sqlite_journal_mode
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+}
+COUNTER_LOCK_RETRIES = 3  # Повторы записи счётчика при «database is locked»
+# Копия базы для чтения горячих страниц, обновляется manage.py sync_replica.
+# Без QUOTES_REPLICA_DB всё читается из default.
+REPLICA_DATABASE_PATH = os.environ.get("QUOTES_REPLICA_DB", "")
+if REPLICA_DATABASE_PATH:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": REPLICA_DATABASE_PATH,
+        "TEST": {"MIRROR": "default"},
+    }
+READ_REPLICA_ALIAS = "replica" if REPLICA_DATABASE_PATH else None
+READ_REPLICA_PIN_SECONDS = 5  # Секунд чтения с default после голоса или добавления
+DATABASE_ROUTERS = ["catalog.routers.ReadReplicaRouter"]
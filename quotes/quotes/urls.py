@@ -28,6 +28,12 @@ urlpatterns += [
     path("catalog/", include("catalog.urls")),
 ]
 
+from catalog.views import metrics_view
+
+urlpatterns += [
+    path("metrics", metrics_view, name="metrics"),
+]
+
 from django.views.generic import RedirectView
 
 urlpatterns += [
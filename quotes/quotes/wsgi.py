@@ -13,4 +13,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "quotes.settings")
 
-application = get_wsgi_application()
+from catalog.static_layer import StaticFilesLayer  # noqa: E402
+
+# Статика из STATIC_ROOT отдаётся до Django, с долгим кэшем для файлов с хэшем
+application = StaticFilesLayer(get_wsgi_application())